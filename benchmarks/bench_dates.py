@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Date normalisation over the raw dates found in the fixtures: dateutil for
+every string, as HtmlMeta did, against dates.normalize_date without and with
+its memo.
+
+  PYTHONPATH=. python benchmarks/bench_dates.py
+"""
+import glob
+import logging
+import time
+
+from dateutil.parser import parse
+from dateutil.tz import tzoffset
+
+from metadoc.extract import dates
+from metadoc.extract.html import HtmlMeta
+
+ROUNDS = 200
+
+def read_dates():
+  raw = []
+  for path in sorted(glob.glob("tests/fixtures/*/*")):
+    if "activity_endpoints" in path:
+      continue
+    with open(path, "rb") as f:
+      meta = HtmlMeta(f.read())
+    meta.extract()
+    raw += [str(d) for d in meta.dates.values()]
+    raw += [meta.jsonld[k] for k in ("datePublished", "dateCreated", "dateModified")
+      if isinstance(meta.jsonld.get(k), str)]
+  return raw
+
+def with_dateutil(value):
+  return parse(value).astimezone().astimezone(tzoffset(None, 0)).replace(microsecond=0).isoformat()
+
+def without_memo(value):
+  return dates.to_utc_iso(dates.parse_date(value))
+
+def attempt(func, value):
+  try:
+    return func(value)
+  except (ValueError, OverflowError) as exc:
+    return type(exc) # some publisher dates are unreadable
+
+def timed(func, raw):
+  results = []
+  start_time = time.time()
+  for i in range(ROUNDS):
+    results = [attempt(func, value) for value in raw]
+  return results, (time.time() - start_time) / ROUNDS / len(raw)
+
+if __name__ == "__main__":
+  logging.disable(logging.CRITICAL)
+  raw = read_dates()
+  print("{} raw dates, {} distinct".format(len(raw), len(set(raw))))
+  print("{:>12} {:>10} {:>6}".format("", "us/date", "same"))
+  baseline, baseline_time = timed(with_dateutil, raw)
+  print("{:>12} {:>10.1f} {:>6}".format("dateutil", baseline_time * 1e6, "-"))
+  for name, func in [("fast path", without_memo), ("memoized", dates.normalize_date)]:
+    results, elapsed = timed(func, raw)
+    print("{:>12} {:>10.1f} {:>6}".format(name, elapsed * 1e6, str(results == baseline)))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Scaling of near-duplicate filtering over growing candidate counts,
+difflib.get_close_matches against every candidate vs. FuzzyMatcher.
+Candidates are capitalised words and word pairs taken from the fixtures.
+
+  PYTHONPATH=. python benchmarks/bench_dedup.py
+"""
+import difflib
+import glob
+import random
+import re
+import time
+
+import lxml.html
+
+from metadoc.extract.fuzzy import FuzzyMatcher
+
+SIZES = [250, 500, 1000, 2000, 4000, 8000]
+MAX_DIFFLIB = 2000 # quadratic, gets too slow beyond
+
+def read_candidates():
+  candidates = set()
+  for path in glob.glob("tests/fixtures/*/*"):
+    try:
+      text = lxml.html.fromstring(open(path, "rb").read()).text_content()
+    except Exception:
+      continue
+    candidates.update(w.lower() for w in re.findall(r"[A-Z][a-z]{2,}", text))
+    candidates.update(" ".join(m) for m in re.findall(r"([A-Z][a-z]+) ([A-Z][a-z]+)", text))
+  candidates = sorted(candidates)
+  random.Random(0).shuffle(candidates)
+  return candidates
+
+def filter_difflib(words):
+  close_matches = []
+  wordlist = set(words)
+  for word in words:
+    if word in close_matches: continue
+    matches = difflib.get_close_matches(word, wordlist, 2)
+    if len(matches) > 1:
+      close_matches += matches[1:]
+  return wordlist.difference(close_matches)
+
+def filter_fuzzy(words):
+  close_matches = set()
+  matcher = FuzzyMatcher(words)
+  for word in words:
+    if word in close_matches: continue
+    match = matcher.best_match(word)
+    if match is not None:
+      close_matches.add(match)
+  return set(words).difference(close_matches)
+
+def timed(func, words):
+  start_time = time.time()
+  res = func(words)
+  return res, time.time() - start_time
+
+if __name__ == "__main__":
+  candidates = read_candidates()
+  print("{:>6} {:>10} {:>10} {:>6}".format("n", "difflib", "fuzzy", "same"))
+  for n in SIZES:
+    words = candidates[:n]
+    fuzzy, fuzzy_time = timed(filter_fuzzy, words)
+    if n <= MAX_DIFFLIB:
+      baseline, baseline_time = timed(filter_difflib, words)
+      print("{:>6} {:>9.2f}s {:>9.2f}s {:>6}".format(n, baseline_time, fuzzy_time, str(fuzzy == baseline)))
+    else:
+      print("{:>6} {:>10} {:>9.2f}s {:>6}".format(n, "-", fuzzy_time, "-"))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Metadata harvesting per article: the previous XPath scans (//meta, //link,
+//script and one query per date rule) against HtmlMeta's single pass, with
+and without head_only. Trees are parsed once up front, all properties read.
+
+  PYTHONPATH=. python benchmarks/bench_html.py
+"""
+import glob
+import logging
+import time
+
+from metadoc.extract import document
+from metadoc.extract.html import HtmlMeta
+
+ROUNDS = 20
+PROPERTIES = ["title", "description", "canonical_url", "image", "authors", "published_date", "modified_date"]
+
+DATE_XPATHS = [
+  "//meta[@name='date']/@content",
+  "//meta[@property='article:published_time']/@content",
+  "//meta[@property='article:published']/@content",
+  "//meta[@name='parsely-pub-date']/@content",
+  "//meta[@name='DC.date.issued']/@content",
+  "//time[@itemprop='datePublished']/@datetime",
+  "//meta[@property='article:modified_time']/@content",
+  "//meta[@property='article:modified']/@content",
+  "//meta[@name='last-modified']/@content",
+]
+
+def xpath_scans(tree):
+  '''The queries HtmlMeta used to run, without building its results.'''
+  for node in tree.xpath("//meta"):
+    node.xpath('@property') or node.xpath('@itemprop') or node.xpath('@name')
+    node.xpath('@content')
+  for node in tree.xpath("//link"):
+    node.xpath('@rel')
+    node.xpath('@href')
+  tree.xpath('descendant-or-self::script[@type="application/ld+json"]')
+  for xpath in DATE_XPATHS:
+    tree.xpath(xpath)
+  tree.xpath("(//title)[1]//text()")
+  tree.xpath("(//span[@itemprop='author'])[1]//span[@itemprop='name']/text()")
+
+def single_pass(tree, head_only=False):
+  meta = HtmlMeta(None, tree=tree, head_only=head_only)
+  meta.extract()
+  for prop in PROPERTIES:
+    getattr(meta, prop)
+
+def timed(func, trees):
+  start_time = time.time()
+  for i in range(ROUNDS):
+    for tree in trees:
+      func(tree)
+  return (time.time() - start_time) / ROUNDS / len(trees)
+
+if __name__ == "__main__":
+  logging.disable(logging.CRITICAL)
+  trees = []
+  for path in sorted(glob.glob("tests/fixtures/*/*")):
+    if "activity_endpoints" not in path:
+      with open(path, "rb") as f:
+        trees.append(document.parse(*document.to_bytes(f.read())))
+
+  print("{:>20} {:>12}".format("", "ms/article"))
+  for name, func in [
+    ("xpath scans", xpath_scans),
+    ("single pass", single_pass),
+    ("head only", lambda tree: single_pass(tree, head_only=True)),
+  ]:
+    print("{:>20} {:>12.2f}".format(name, timed(func, trees) * 1000))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Bytes read and parse time of the streaming "meta" mode against parsing
+the whole page, over the fixtures fed in 16 KiB chunks as if downloaded.
+
+  PYTHONPATH=. python benchmarks/bench_meta.py
+"""
+import glob
+import logging
+import time
+
+from metadoc.extract.html import HtmlMeta
+from metadoc.extract.stream import stream_meta, CHUNK_SIZE
+
+PROPERTIES = ["title", "canonical_url", "image", "authors", "published_date", "modified_date"]
+
+def full(content):
+  meta = HtmlMeta(content)
+  meta.extract()
+  return [getattr(meta, prop) for prop in PROPERTIES], len(content)
+
+def streamed(content):
+  chunks = (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+  meta, bytes_read = stream_meta(chunks)
+  return [getattr(meta, prop) for prop in PROPERTIES], bytes_read
+
+if __name__ == "__main__":
+  logging.disable(logging.CRITICAL)
+  pages = []
+  for path in sorted(glob.glob("tests/fixtures/*/*")):
+    if "activity_endpoints" not in path:
+      with open(path, "rb") as f:
+        pages.append(f.read())
+
+  print("{:>10} {:>10} {:>12} {:>6}".format("", "KiB read", "ms/article", "same"))
+  baseline = None
+  for name, func in [("full", full), ("streamed", streamed)]:
+    start_time = time.time()
+    results = [func(page) for page in pages]
+    elapsed = (time.time() - start_time) / len(pages)
+    fields = [r[0] for r in results]
+    baseline = baseline or fields
+    print("{:>10} {:>10} {:>12.1f} {:>6}".format(name, sum(r[1] for r in results) // 1024,
+      elapsed * 1000, str(fields == baseline)))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Parse time and peak memory per article of the previous text pipeline
+(decode, emoji regex over the text, re-encode for goose, goose parses)
+against the byte pipeline of Extractor (one parse shared with goose).
+Both run goose text extraction and HtmlMeta over the fixtures.
+
+  PYTHONPATH=. python benchmarks/bench_parse.py
+"""
+import glob
+import logging
+import re
+import time
+import tracemalloc
+
+from goose3 import Goose, Configuration
+
+from metadoc.extract import Extractor
+from metadoc.extract.html import HtmlMeta
+
+ROUNDS = 5
+
+emoji_pattern = re.compile("["
+    u"\U0001F600-\U0001F64F"
+    u"\U0001F300-\U0001F5FF"
+    u"\U0001F680-\U0001F6FF"
+    u"\U0001F1E0-\U0001F1FF"
+  "]+", flags=re.UNICODE)
+
+def read_fixtures():
+  pages = []
+  for path in sorted(glob.glob("tests/fixtures/*/*")):
+    if "activity_endpoints" in path:
+      continue
+    with open(path, "rb") as f:
+      pages.append(f.read())
+  return pages
+
+def metadata(html_meta):
+  html_meta.extract()
+  return (html_meta.title, html_meta.authors, html_meta.published_date, html_meta.canonical_url)
+
+def text_pipeline(goose, content):
+  html = content.decode("utf-8", "replace") # as requests would
+  html = emoji_pattern.sub(r'', html)
+  html = html.replace('<meta charset="">', '<meta charset="utf-8">')
+  res = goose.extract(url=None, raw_html=html.encode("utf-8"))
+  return res.cleaned_text, metadata(HtmlMeta(html, tree=res.raw_doc))
+
+def byte_pipeline(goose, content):
+  extractor = Extractor(content)
+  extractor.goose = goose
+  extractor.sanitize_html()
+  extractor.parse_html()
+  extractor.extract_text()
+  return extractor.fulltext, metadata(HtmlMeta(extractor.content, tree=extractor.tree))
+
+def measure(pipeline, goose, pages):
+  results, peaks = [], []
+  start_time = time.time()
+  for i in range(ROUNDS):
+    results = [pipeline(goose, page) for page in pages]
+  elapsed = (time.time() - start_time) / ROUNDS / len(pages)
+
+  for page in pages:
+    tracemalloc.start()
+    pipeline(goose, page)
+    peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+  return results, elapsed, sum(peaks) / len(peaks)
+
+if __name__ == "__main__":
+  logging.disable(logging.CRITICAL)
+  config = Configuration()
+  config.enable_image_fetching = False
+  goose = Goose(config=config)
+  pages = read_fixtures()
+
+  print("{:>8} {:>12} {:>14}".format("", "ms/article", "peak KiB/art."))
+  outputs = []
+  for name, pipeline in [("text", text_pipeline), ("bytes", byte_pipeline)]:
+    results, elapsed, peak = measure(pipeline, goose, pages)
+    outputs.append(results)
+    print("{:>8} {:>12.1f} {:>14.0f}".format(name, elapsed * 1000, peak / 1024))
+  same = sum(a == b for a, b in zip(*outputs))
+  print("identical results: {}/{}".format(same, len(pages)))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compare the dict-of-dicts perceptron, its array-backed layout and the
+mmap-ed binary model file: load time, tagging throughput on the training
+corpus and memory allocated for the model.
+
+  PYTHONPATH=. python benchmarks/bench_tagger.py
+"""
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from metadoc.extract.pos import AveragedPerceptronTagger, TRAINING_SET
+
+def read_sentences(limit=2000):
+  sentences, words = [], []
+  for line in open(TRAINING_SET):
+    params = line.split(' ')
+    if len(params) != 2: continue
+    words.append(params[0])
+    if params[0] == '.':
+      sentences.append(words)
+      words = []
+  # the training set is a handful of very long "sentences", chunk it up
+  flat = [w for s in sentences for w in s]
+  return [flat[i:i+25] for i in range(0, len(flat), 25)][:limit]
+
+def train(sentences, tmp_dir):
+  random.seed(0)
+  tagger = AveragedPerceptronTagger(autoload=False)
+  data, words, tags = [], [], []
+  for line in open(TRAINING_SET):
+    params = line.split(' ')
+    if len(params) != 2: continue
+    words.append(params[0])
+    tags.append(params[1])
+    if params[0] == '.':
+      data.append((words, tags))
+      words, tags = [], []
+  tagger.train(data)
+  pickle_loc, bin_loc = os.path.join(tmp_dir, "tagger.pickle"), os.path.join(tmp_dir, "tagger.bin")
+  tagger.save(pickle_loc)
+  tagger.save(bin_loc)
+  return pickle_loc, bin_loc
+
+def load(loc, compact):
+  tagger = AveragedPerceptronTagger(autoload=False)
+  tagger.load(loc)
+  return tagger.compact() if compact else tagger
+
+def measure_load(loc, compact):
+  gc.collect()
+  start_time = time.time()
+  load(loc, compact)
+  elapsed = time.time() - start_time
+
+  gc.collect()
+  tracemalloc.start()
+  tagger = load(loc, compact)
+  gc.collect()
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return tagger, size, elapsed
+
+def bench(label, loc, compact, sentences):
+  tagger, size, load_time = measure_load(loc, compact)
+  n_tokens = sum(len(s) for s in sentences)
+  start_time = time.time()
+  tags = [tagger.tag(" ".join(s)) for s in sentences]
+  elapsed = time.time() - start_time
+  print("{:8} {:>7.0f} ms load {:>10.0f} tokens/sec {:>8.1f} MB allocated".format(
+    label, load_time * 1000, n_tokens / elapsed, size / 2**20))
+  return tags
+
+if __name__ == "__main__":
+  sentences = read_sentences()
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    pickle_loc, bin_loc = train(sentences, tmp_dir)
+    before = bench("dict", pickle_loc, False, sentences)
+    compact = bench("compact", pickle_loc, True, sentences)
+    mapped = bench("mmap", bin_loc, False, sentences)
+  print("identical tags:", before == compact == mapped)
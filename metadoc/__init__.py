@@ -9,71 +9,108 @@ __version__ = '0.10.5'
 import asyncio
 import time
 import concurrent
-import requests
-import urllib.parse
 import os
-import re
 import sys
 import logging
+import types
 
 from .domain import Domaintools
 from .extract import Extractor
-from .social import ActivityCount
+from .extract.document import UTF8_UMLAUTS
+from .extract.html import HtmlMeta
+from .extract.suffix import registered_domain
+from .extract.stream import stream_meta, CHUNK_SIZE
+from .fetch import fetcher as shared_fetcher, USER_AGENT
+from .social import ActivityCount, sessions
 
 logger = logging.getLogger()
 logger.setLevel(os.environ.get("LOGLEVEL", "INFO"))
 formatter = logging.Formatter('%(asctime)s [%(name)s] %(levelname)s %(message)s')
 
-# set user agent
-USER_AGENT = os.environ.get("USER_AGENT",
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/67.0.3396.87 Safari/537.36")
-
 if not os.environ.get("LAMBDA_TASK_ROOT", False):
     # add stream handler, except for AWS Lambda
     ch = logging.StreamHandler(sys.stdout)
     ch.setFormatter(formatter)
     logger.addHandler(ch)
 
+SECTIONS = ("extract", "domain", "social")
+
 class Metadoc(object):
 
     def __init__(self, url=None, html=None, **kwargs):
         """Metadoc API, initialize with
         :param url: The article url we shall investigate, required.
-        :param html: You can pass in the article html manually, optional.
+        :param html: You can pass in the article html manually, as text or bytes, optional.
+        :param encoding: Charset of the html bytes, sniffed if missing, optional.
+        :param sentence_cache: Cache for named entities per sentence, shared
+            across articles, e.g. metadoc.cache.LRUCache, optional.
+        :param extract_cache: Cache for extraction results per page content,
+            e.g. metadoc.cache.SQLiteCache to share it between workers, optional.
+        :param response_cache: metadoc.cache.ResponseCache for the sections of
+            full queries by url, optional.
+        :param fetcher: metadoc.fetch.Fetcher downloading the article, the
+            shared one if missing, optional.
         """
         logger.info("Processing url: {}".format(url))
 
         self.errors = []
         self.html = html or None
+        self.encoding = kwargs.get("encoding")
         self.url = url or None
 
         if not self.url:
           raise AttributeError('Missing \"url\" attribute.')
 
+        self.sentence_cache = kwargs.get("sentence_cache")
+        self.extract_cache = kwargs.get("extract_cache")
+        self.response_cache = kwargs.get("response_cache")
+        self.fetcher = kwargs.get("fetcher") or shared_fetcher
+        self._options = dict(kwargs, html=html) # as given, cf. _recompute
+        self.page = None
+        self._extract_error = None
+
         self.extractor = None
         self.activity = None
         self.domain = None
-
-    def _prepare(self):
-        if not self.html:
-            self.html = self._request_url()
-        self.extractor = Extractor(html=self.html) # Named entities, synthetic summaries
-        self.activity = ActivityCount(url=self.url) # Social activity from various networks
-        self.domain = Domaintools(url=self.url) # Domain whois date, blacklisting
+        self.meta = None
+
+    def _prepare(self, sections=SECTIONS):
+        if "extract" in sections:
+            if not self.html and self.page is None: # no body on a 304, results are cached
+                self._request_url()
+            self.extractor = Extractor(html=self.html, encoding=self.encoding, url=self.url,
+                sentence_cache=self.sentence_cache, extract_cache=self.extract_cache,
+                cachekey=self.page and self.page.cachekey) # Named entities, synthetic summaries
+        if "social" in sections:
+            self.activity = ActivityCount(url=self.url) # Social activity from various networks
+        if "domain" in sections:
+            self.domain = Domaintools(url=self.url) # Domain whois date, blacklisting
 
     def query(self, mode=None, fmt=None):
+        """Query all sources, or only those of
+        :param mode: "social", "domain", "extract", or "meta" for the metadata
+            in the head of the page, which is only downloaded as far as needed.
+        """
         data = None
         try:
-            self._prepare()
-            calls = {
-                "social": self._query_social,
-                "domain": self._query_domain,
-                "extract": self._query_extract,
-            }
-            calls.get(mode, self._query_all)()
-            data = self._render_social() if fmt == "social" else self._render()
-            if mode is None:
-                self._check_result(data)
+            if mode == "meta":
+                self._query_meta()
+                data = self._render_meta()
+            elif mode is None and self.response_cache is not None:
+                self._query_cached()
+                data = self._render_social() if fmt == "social" else self._render()
+                self._check_result(data) # cached sections too
+            else:
+                self._prepare()
+                calls = {
+                    "social": self._query_social,
+                    "domain": self._query_domain,
+                    "extract": self._query_extract,
+                }
+                calls.get(mode, self._query_all)()
+                data = self._render_social() if fmt == "social" else self._render()
+                if mode is None:
+                    self._check_result(data)
         except Exception as exc:
             logger.error("Error when processing {}".format(self.url))
             logger.exception(exc)
@@ -84,38 +121,182 @@ class Metadoc(object):
             return self._render_errors()
         return data
 
+    async def aquery(self):
+        """Query all sources like query(), from within a running event loop.
+        Social and domain lookups start while the article is downloaded,
+        only the extraction waits for it. Connections are kept for the next
+        query on the same loop, await sessions.close() before closing it.
+        """
+        data = None
+        try:
+            succeeded = await self._aquery_sections(SECTIONS)
+            if "extract" not in succeeded:
+                raise self._extract_error
+            data = self._render()
+            self._check_result(data)
+        except Exception as exc:
+            logger.error("Error when processing {}".format(self.url))
+            logger.exception(exc)
+            self.errors.append(str(exc))
+
+        if data is None or self.errors:
+            return self._render_errors()
+        return data
+
+    async def _aquery_sections(self, sections):
+        loop = asyncio.get_event_loop()
+        self._prepare([section for section in sections if section != "extract"])
+        subtasks = {}
+        if "extract" in sections:
+            subtasks["extract"] = asyncio.ensure_future(self._aquery_extract(loop))
+        if "domain" in sections:
+            subtasks["domain"] = asyncio.ensure_future(self.domain.aget_all())
+        if "social" in sections:
+            subtasks["social"] = self.activity.get_all(loop)
+
+        await asyncio.wait(list(subtasks.values()))
+        return self._collect(subtasks)
+
+    async def _aquery_extract(self, loop):
+        if not self.html:
+            session = sessions.get()
+            self.page = await self.fetcher.afetch(self.url, session,
+                conditional=self.extract_cache is not None)
+            if self._results_evicted():
+                self.page = await self.fetcher.afetch(self.url, session)
+            self.html, self.encoding = self.page.content, self.page.encoding
+        self._prepare(["extract"])
+        await loop.run_in_executor(None, self.extractor.get_all) # cpu bound
+
     def _query_all(self):
         """Combine all available resources"""
-        subtasks = []
+        self._query_sections(SECTIONS)
+
+    def _query_sections(self, sections):
+        """Query the given sources concurrently, return those which succeeded"""
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
-        subtasks.append(loop.run_in_executor(executor, self.extractor.get_all))
-        subtasks.append(loop.run_in_executor(executor, self.domain.get_all))
-        subtasks.append(self.activity.get_all(loop))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        subtasks = {}
+        if "extract" in sections:
+            subtasks["extract"] = loop.run_in_executor(executor, self.extractor.get_all)
+        if "domain" in sections:
+            subtasks["domain"] = asyncio.ensure_future(self.domain.aget_all()) # whois as subprocess
+        if "social" in sections:
+            subtasks["social"] = loop.run_in_executor(executor, self._query_social)
 
-        loop.run_until_complete(asyncio.wait(subtasks, loop=loop))
+        loop.run_until_complete(asyncio.wait(list(subtasks.values())))
         loop.close()
+        executor.shutdown(wait=False)
+        return self._collect(subtasks)
+
+    def _collect(self, subtasks):
+        """Sections whose subtasks succeeded"""
+        succeeded = []
+        for section, task in subtasks.items():
+            if task.exception() is not None:
+                logger.error("Querying {} of {} failed".format(section, self.url))
+                logger.exception(task.exception())
+                if section == "extract":
+                    self._extract_error = task.exception()
+            elif section != "social" or any(r["status"] == "ok" for r in self.activity.responses):
+                succeeded.append(section)
+        if "extract" in succeeded:
+            self._remember_page()
+        return succeeded
+
+    def _query_cached(self):
+        """Assemble the sections from the response cache, query missing ones
+        and refresh stale ones in the background."""
+        missing, stale = [], []
+        for section in SECTIONS:
+            cached = self.response_cache.get(self.url, section)
+            if cached is None:
+                missing.append(section)
+                continue
+            data, fresh = cached
+            self._restore(section, data)
+            if not fresh:
+                stale.append(section)
+
+        if missing:
+            self._prepare(missing)
+            for section in self._query_sections(missing):
+                self.response_cache.set(self.url, section, self._section_data(section))
+        if stale:
+            self.response_cache.refresh(self.url, stale, self._recompute)
+
+    def _recompute(self, sections):
+        """Query sections anew in a separate instance with the same options,
+        except the response cache, cf. ResponseCache.refresh"""
+        options = {k: v for k, v in self._options.items() if k != "response_cache"}
+        metadoc = Metadoc(url=self.url, **options)
+        metadoc._prepare(sections)
+        return {section: metadoc._section_data(section)
+            for section in metadoc._query_sections(sections)}
+
+    def _section_data(self, section):
+        """Plain data of a queried section, as stored in the response cache"""
+        if section == "social":
+            return self.activity.responses
+        source, fields = {
+            "extract": (self.extractor, Extractor.RESULT_FIELDS + ("scraped_date",)),
+            "domain": (self.domain, ("domain", "credibility", "date_registered_iso")),
+        }[section]
+        return {field: getattr(source, field) for field in fields if hasattr(source, field)}
+
+    def _restore(self, section, data):
+        if section == "social":
+            self.activity = types.SimpleNamespace(responses=data)
+        elif section == "domain":
+            self.domain = types.SimpleNamespace(**data)
+        else:
+            self.extractor = types.SimpleNamespace(**data)
 
     def _query_domain(self):
         self.domain.get_all()
 
     def _query_social(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(self.activity.get_all(loop))
-        loop.close()
+        sessions.run(self.activity.collect()) # keeps provider connections alive
 
     def _query_extract(self):
         self.extractor.get_all()
+        self._remember_page()
+
+    def _query_meta(self):
+        domain = registered_domain(self.url)
+        if self.html:
+            self.meta = HtmlMeta(self.html, encoding=self.encoding, domain=domain)
+            return
+
+        req = self.fetcher.open(self.url)
+        try:
+            content_type = req.headers.get("content-type", "")
+            declared = req.encoding if "charset" in content_type.lower() else None
+            self.meta, bytes_read = stream_meta(req.iter_content(CHUNK_SIZE),
+                encoding=declared, domain=domain)
+            logger.debug("Read {} bytes of {}".format(bytes_read, self.url))
+        finally:
+            req.close() # stop downloading the rest
 
     def _render_errors(self):
         return {
             "errors": self.errors
         }
 
+    def _render_meta(self):
+        return {
+          "url": self.url,
+          "title": getattr(self.meta, "title", None),
+          "authors": getattr(self.meta, "authors", None),
+          "canonical_url": getattr(self.meta, "canonical_url", None),
+          "image": getattr(self.meta, "image", None),
+          "published_date": getattr(self.meta, "published_date", None),
+          "modified_date": getattr(self.meta, "modified_date", None),
+          "__version__": __version__
+        }
+
     def _render_social(self):
         return {
           "url": self.url,
@@ -135,6 +316,7 @@ class Metadoc(object):
           "image": getattr(self.extractor, "image", None),
           "social": getattr(self.activity, "responses", None),
           "language": getattr(self.extractor, "language", None),
+          "language_confidence": getattr(self.extractor, "language_confidence", None),
           "published_date": getattr(self.extractor, "published_date", None),
           "modified_date": getattr(self.extractor, "modified_date", None),
           "scraped_date": getattr(self.extractor, "scraped_date", None),
@@ -162,7 +344,7 @@ class Metadoc(object):
             logger.warning("No title: {}".format(self.url))
         if not res.get("canonical_url"):
             logger.warning("No canonical url: {}".format(self.url))
-        if len(res.get("text", {}).get("fulltext", [])) < 50:
+        if len(res.get("text", {}).get("fulltext") or "") < 50:
             logger.warning("No or little text: {}".format(self.url))
         if not res.get("entities", {}).get("names"):
             logger.warning("No names: {}".format(self.url))
@@ -172,34 +354,25 @@ class Metadoc(object):
             logger.warning("No domain name: {}".format(self.url))
 
     def _request_url(self):
-        """In case no html parameter was provided to the constructor"""
-
-        p = urllib.parse.urlparse(self.url)
-        netloc = p.netloc or p.path
-        path = p.path if p.netloc else ''
-        # if not netloc.startswith('www.'):
-        #     netloc = 'www.' + netloc
-
-        p = urllib.parse.ParseResult(p.scheme, netloc, path, *p[3:])
-        url = p.geturl()
-
-        req = requests.get(url, headers={
-          'Accept-Encoding': 'identity, gzip, deflate, *',
-          'User-Agent': USER_AGENT
-        })
-
-        if req.status_code != 200:
-          raise Exception('Requesting article body failed with {} status code.'.format(req.status_code))
-
-        if self._check_invalid_encoding(req.text):
-            # check for encoding conflicts (e.g. t3n.de)
-            enc_apparent = req.apparent_encoding.lower()
-            if req.encoding.lower() != enc_apparent and \
-               enc_apparent != "windows-1254":
-                logger.info("Switching html encoding: {} -> {}".format(req.encoding, enc_apparent))
-                req.encoding = enc_apparent
-        return req.text
+        """In case no html parameter was provided to the constructor. The
+        body is kept as bytes, the extractor sniffs its charset and parses it
+        once. With an extract cache, unchanged pages are not downloaded again."""
+        conditional = self.extract_cache is not None
+        self.page = self.fetcher.fetch(self.url, conditional=conditional)
+        if self._results_evicted():
+            self.page = self.fetcher.fetch(self.url)
+        self.html, self.encoding = self.page.content, self.page.encoding
+
+    def _results_evicted(self):
+        """Page unchanged, but its extraction results are no longer cached"""
+        return self.page.not_modified and self.extract_cache.get(self.page.cachekey) is None
+
+    def _remember_page(self):
+        if self.page is not None and not self.page.not_modified and self.extractor.cachekey:
+            self.fetcher.remember(self.page, self.extractor.cachekey)
 
     def _check_invalid_encoding(self, html):
-        r=r'(Ã¼|Ã¤|Ã¶|Ã¼)'
-        return True if re.search(r, html, re.I|re.M) else False
+        """UTF-8 umlauts decoded as latin-1, e.g. fÃ¼r, cf. extract.document.sniff_encoding"""
+        if isinstance(html, str):
+            html = html.encode("latin-1", "ignore")
+        return UTF8_UMLAUTS.search(html) is not None
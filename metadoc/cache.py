@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Bounded key-value caches. Values are stored pickled, which keeps cached
+objects immutable for callers and lets the size cap count actual bytes.
+
+    LRUCache       in-process, least recently used entries are evicted first
+    SQLiteCache    file-backed, shared by all worker processes on a host
+    TieredCache    an LRUCache in front of a SQLiteCache
+    ResponseCache  Metadoc response sections with TTLs, on top of either
+"""
+import collections
+import concurrent.futures
+import logging
+import os
+import pickle
+import threading
+import time
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+class LRUCache(object):
+    """In-memory LRU cache, bounded by the total size of keys and values.
+    :param max_bytes: Size cap, least recently used entries are evicted beyond.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            blob = self._data.get(key)
+            if blob is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(blob)
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        size = len(key) + len(blob)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(key) + len(old)
+            self._data[key] = blob
+            self.size += size
+            while self.size > self.max_bytes:
+                old_key, old = self._data.popitem(last=False)
+                self.size -= len(old_key) + len(old)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(key) + len(old)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._data),
+            "bytes": self.size,
+        }
+
+class SQLiteCache(object):
+    """Cache in a SQLite file, so worker processes can reuse each other's results.
+    Entries are evicted oldest first once the file holds more than ``max_bytes``
+    of values, checked every ``evict_every`` writes.
+    :param path: Database file, created if missing.
+    """
+
+    def __init__(self, path, max_bytes=512 * 2**20, evict_every=100):
+        import sqlite3 # replaced by a dummy module on AWS Lambda, cf. ner.py
+        self._sqlite3 = sqlite3
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, stored REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_stored ON cache (stored)")
+
+    def _connect(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        try:
+            row = self._connect().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        except self._sqlite3.Error as exc:
+            logger.error("Reading cache {} failed".format(self.path))
+            logger.exception(exc)
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO cache (key, value, size, stored) VALUES (?, ?, ?, ?)",
+                    (key, self._sqlite3.Binary(blob), len(blob), time.time()))
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self.evict()
+        except self._sqlite3.Error as exc:
+            logger.error("Writing cache {} failed".format(self.path))
+            logger.exception(exc)
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def evict(self):
+        with self._connect() as conn:
+            while True:
+                count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+                if total <= self.max_bytes:
+                    return
+                conn.execute("DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY stored LIMIT ?)", (max(1, count // 10),))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+class TieredCache(object):
+    """Look up in memory first, then in the file shared between workers.
+    Entries found in the file are kept in memory from then on.
+    """
+
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return default if value is None else value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+TRACKING_PREFIXES = ("utm_", "fbclid", "gclid", "ocid")
+
+def normalize_url(url):
+    """Cache key for an article url: lowercase scheme and host, no default
+    port, fragment, tracking parameters or trailing slash, sorted query.
+    """
+    p = urllib.parse.urlsplit(url.strip())
+    scheme = (p.scheme or "http").lower()
+    host = (p.hostname or "").lower()
+    if p.port and (scheme, p.port) not in (("http", 80), ("https", 443)):
+        host = "{}:{}".format(host, p.port)
+    query = sorted((k, v) for k, v in urllib.parse.parse_qsl(p.query, keep_blank_values=True)
+        if not k.startswith(TRACKING_PREFIXES))
+    path = p.path.rstrip("/") or "/"
+    return urllib.parse.urlunsplit((scheme, host, path, urllib.parse.urlencode(query), ""))
+
+class ResponseCache(object):
+    """Sections of Metadoc responses by normalized url, each section with its
+    own time to live. A section past its TTL is still served for as long again,
+    while a fresh one is computed in the background (stale-while-revalidate).
+    :param backend: LRUCache or SQLiteCache holding the entries.
+    :param ttls: Seconds per section, cf. TTLS.
+    :param max_workers: Threads for background refreshes.
+    """
+    TTLS = {
+        "social": 10 * 60, # share counts move quickly
+        "domain": 7 * 24 * 60 * 60, # whois dates and blacklists hardly do
+        "extract": 24 * 60 * 60, # content changes are caught by the extract cache
+    }
+
+    def __init__(self, backend=None, ttls=None, max_workers=2):
+        self.backend = backend if backend is not None else LRUCache()
+        self.ttls = dict(self.TTLS, **(ttls or {}))
+        self.stale_hits = 0
+        self.refreshes = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def _key(self, url, section):
+        return "response:{}:{}".format(section, normalize_url(url))
+
+    def get(self, url, section):
+        """Return (data, fresh), or None if missing or expired."""
+        entry = self.backend.get(self._key(url, section))
+        if entry is None:
+            return None
+        stored, data = entry
+        age = time.time() - stored
+        ttl = self.ttls[section]
+        if age < ttl:
+            return data, True
+        if age < 2 * ttl:
+            self.stale_hits += 1
+            return data, False
+        return None
+
+    def set(self, url, section, data):
+        self.backend.set(self._key(url, section), (time.time(), data))
+
+    def refresh(self, url, sections, compute):
+        """Recompute stale sections in the background, at most once at a time.
+        :param compute: Called with the sections, returns {section: data} of those it got.
+        """
+        with self._lock:
+            sections = [s for s in sections if (url, s) not in self._pending]
+            self._pending.update((url, s) for s in sections)
+        if not sections:
+            return None
+        self.refreshes += 1
+        return self._executor.submit(self._refresh, url, sections, compute)
+
+    def _refresh(self, url, sections, compute):
+        try:
+            for section, data in compute(sections).items():
+                self.set(url, section, data)
+        except Exception as exc:
+            logger.error("Refreshing {} of {} failed".format(", ".join(sections), url))
+            logger.exception(exc)
+        finally:
+            with self._lock:
+                self._pending.difference_update((url, s) for s in sections)
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats.update(stale_hits=self.stale_hits, refreshes=self.refreshes)
+        return stats
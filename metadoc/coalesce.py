@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""In-flight de-duplication of upstream lookups. Concurrent calls with the
+same key, from threads or event loops alike, wait for the one call already
+running instead of starting their own.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+class Coalescer(object):
+    """Share the result of a running call with concurrent callers of the
+    same key. Followers get a copy of the result, or the same exception.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.saved = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """The future of the call in flight, and whether we have to make it"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.saved += 1
+                return future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            self.calls += 1
+            return future, True
+
+    def _settle(self, key, future, result=None, exc=None):
+        with self._lock:
+            del self._inflight[key]
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func, *args):
+        """Call func, unless a call for key is in flight already"""
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = func(*args)
+        except BaseException as exc: # followers must not wait forever
+            self._settle(key, future, exc=exc)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def ado(self, key, func, *args):
+        """Await the coroutine function func, unless a call for key is in flight already"""
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(await asyncio.wrap_future(future))
+        try:
+            result = await func(*args)
+        except BaseException as exc: # cancelled too
+            self._settle(key, future, exc=exc)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "saved": self.saved, "in_flight": len(self._inflight)}
@@ -1,16 +1,73 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import itertools
+import os
+import types
 from .blacklists import blacklists
+from .store import BlacklistStore
+
+END = None # trie key of the lists naming the domain itself
+
+class BlacklistIndex(object):
+  """Blacklists compiled into a trie of reversed domain labels, e.g.
+  com -> wordpress -> foo, so looking up a host costs one step per label.
+  A host matches the lists of its own entry and those of its parent domains.
+  :param blacklists: Domains per list name, cf. blacklists.py.
+  """
+  def __init__(self, blacklists):
+    self.sources = tuple(sorted(blacklists))
+    domains = {}
+    for source, entries in blacklists.items():
+      for domain in entries:
+        domains.setdefault(domain.strip().strip(".").lower(), set()).add(source)
+
+    self.domains = types.MappingProxyType({d: frozenset(s) for d, s in domains.items()})
+    self._root = {}
+    for domain, sources in self.domains.items():
+      node = self._root
+      for label in reversed(domain.split(".")):
+        node = node.setdefault(label, {})
+      node[END] = sources
+
+  def lookup(self, host):
+    """Names of the lists with host or one of its parent domains"""
+    node = self._root
+    sources = frozenset()
+    for label in reversed(host.lower().rstrip(".").split(".")):
+      node = node.get(label)
+      if node is None:
+        break
+      sources |= node.get(END, frozenset())
+    return sources
+
+  def lookup_many(self, hosts):
+    return {host: self.lookup(host) for host in hosts}
+
+  def below(self, domain):
+    """Listed domains at or under domain, e.g. the blogs of wordpress.com"""
+    labels = domain.lower().rstrip(".").split(".")
+    node = self._root
+    for label in reversed(labels):
+      node = node.get(label)
+      if node is None:
+        return []
+    found, stack = [], [(node, labels)]
+    while stack:
+      node, labels = stack.pop()
+      if END in node:
+        found.append(".".join(labels))
+      stack.extend((child, [label] + labels) for label, child in node.items() if label is not END)
+    return sorted(found)
+
+# feeds imported with store.py, else the lists of blacklists.py
+BLACKLIST_PATH = os.environ.get("BLACKLIST_PATH")
+index = BlacklistStore(BLACKLIST_PATH) if BLACKLIST_PATH else BlacklistIndex(blacklists)
 
 def check_credibility(url):
-  plain_lists = [l for l in list(blacklists.values())]
-  consolidated_list = list(itertools.chain.from_iterable(plain_lists))
-  confidence = consolidated_list.count(url) / len(blacklists)
-  unique_set = set(consolidated_list)
-  
+  sources = index.lookup(url)
+  confidence = len(sources) / len(index.sources)
+
   return {
-    "is_blacklisted": url in consolidated_list,
+    "is_blacklisted": bool(sources),
     "fake_confidence": "{0:.2f}".format(confidence)
-  }
\ No newline at end of file
+  }
@@ -2,13 +2,16 @@
 import math
 import time
 import logging
-import tldextract
 from datetime import datetime, timedelta
-from .lookup import whois_date_registered
+from ..coalesce import Coalescer
+from ..extract.suffix import registered_domain, fqdn
+from .lookup import whois_date_registered, awhois_date_registered, UNKNOWN
 from .check import check_credibility
 
 logger = logging.getLogger(__name__)
 
+lookups = Coalescer() # one whois lookup per domain at a time
+
 class Domaintools(object):
   """Gather various metadata like whois informaion
   and blacklist status about any given hostname
@@ -18,28 +21,42 @@ class Domaintools(object):
     self.get_domain(url)
 
   def get_domain(self, url):
-    no_fetch_extract = tldextract.TLDExtract(suffix_list_urls=None)
-    tld = no_fetch_extract(url)
-    self.domain = "{}.{}".format(tld.domain, tld.suffix)
+    self.domain = registered_domain(url) if url else None
+    self.hostname = fqdn(url) if url else None # blacklists list some subdomains
 
   def get_date_registered(self):
     self.date_registered = whois_date_registered(self.domain)
 
   def check_credibility(self):
-    self.credibility = check_credibility(self.domain)
+    self.credibility = check_credibility(self.hostname)
 
   def get_all(self):
     start_time = time.time()
     if not self.domain: return
-    self.get_date_registered()
+    self.date_registered = lookups.do(self.domain, whois_date_registered, self.domain)
+    self.assess()
+
+    logger.debug("--- domain module %s seconds ---" % (time.time() - start_time))
+
+  async def aget_all(self):
+    """get_all without blocking the event loop on whois"""
+    start_time = time.time()
+    if not self.domain: return
+    self.date_registered = await lookups.ado(self.domain, awhois_date_registered, self.domain)
+    self.assess()
+
+    logger.debug("--- domain module %s seconds ---" % (time.time() - start_time))
+
+  def assess(self):
+    if self.date_registered == UNKNOWN:
+      self.date_registered = None
+      self.date_registered_iso = UNKNOWN
     self.check_credibility()
 
     if self.date_registered:
       self.recalculate_fake_confidence()
       self.date_registered_iso = self.date_registered.isoformat()
 
-    logger.debug("--- domain module %s seconds ---" % (time.time() - start_time))
-
   def recalculate_fake_confidence(self):
     # Adds .2 to fake_confidence if website was registered delta 1y
     one_year_ago = datetime.now() - timedelta(days=1*365)
@@ -1,17 +1,166 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""Whois registration dates, cached by registered domain in memory and in a
+SQLite file shared by the workers. Failed lookups are cached too, for a
+shorter time, so a domain whois cannot answer is not queried on every request.
 
-import urllib
-import whois
-import datetime
+Lookups run the whois binary on a pool of WHOIS_CONCURRENCY threads, so at
+most that many at a time in the process, from any thread or event loop. They
+give up with UNKNOWN after WHOIS_TIMEOUT seconds, waiting for a free thread
+included, killing whois.
 
-def whois_date_registered(domain):
+Pre-warm the cache from a file with one domain per line:
+
+  python -m metadoc.domain.lookup domains.txt
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timezone
+
+from ..cache import LRUCache, SQLiteCache, TieredCache
+from ..extract.dates import parse_date
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = os.environ.get("WHOIS_CACHE_PATH",
+  os.path.join(tempfile.gettempdir(), "metadoc_whois.sqlite")) # empty for memory only
+TTL = 30 * 24 * 60 * 60 # registration dates hardly change
+FAILURE_TTL = 60 * 60
+UNKNOWN_TTL = 5 * 60 # timed out, try again soon
+
+WHOIS_BINARY = os.environ.get("WHOIS_BINARY", "whois")
+TIMEOUT = float(os.environ.get("WHOIS_TIMEOUT", 10))
+CONCURRENCY = int(os.environ.get("WHOIS_CONCURRENCY", 8))
+UNKNOWN = "unknown"
+
+CREATION_DATE = re.compile(r"^\s*(?:creation date|created(?: on)?|registered(?: on)?|registration (?:date|time)"
+  r"|domain registration date|record created|domain record activated)\s*\.*:\s*(\S.*?)\s*$", re.I | re.M)
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENCY) # shared by all event loops
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def whois_cache():
+  """The process-wide cache, opened on first use"""
+  global _cache
+  with _cache_lock:
+    if _cache is None:
+      disk = None
+      if CACHE_FILE:
+        try:
+          disk = SQLiteCache(CACHE_FILE, max_bytes=64 * 2**20)
+        except Exception as exc:
+          logger.warning("Whois cache {} unavailable, keeping it in memory".format(CACHE_FILE))
+          logger.exception(exc)
+      _cache = TieredCache(LRUCache(max_bytes=4 * 2**20), disk)
+    return _cache
+
+def parse_creation_date(text):
+  """First readable creation date in whois output, naive in UTC"""
+  for match in CREATION_DATE.finditer(text):
+    try:
+      date = parse_date(match.group(1))
+    except (ValueError, OverflowError):
+      continue
+    if date.tzinfo is not None:
+      date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+  return None
+
+def _run_whois(domain, deadline):
+  """Output of whois, None if it is not done by the deadline"""
+  remaining = deadline - time.monotonic()
+  if remaining <= 0: # waited too long for a free thread
+    return None
+  process = subprocess.Popen([WHOIS_BINARY, domain],
+    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True)
   try:
-    query = whois.query(domain) # silently fails in corporate env, vocally fails behind proxy
-  except Exception as e:
-    query = None
-    pass
-
-  # if query.creation_date == "before aug-1996": query.creation_date = datetime.datetime(1996) # .co.uk edge case
-  # elif type(query.creation_date) is not "date": query = None
-  return query.creation_date if query else None
\ No newline at end of file
+    out, _ = process.communicate(timeout=remaining)
+    return out
+  except subprocess.TimeoutExpired:
+    return None
+  finally:
+    if process.returncode is None:
+      try:
+        os.killpg(process.pid, signal.SIGKILL) # whois and whatever it started
+      except ProcessLookupError:
+        pass
+      process.communicate()
+
+async def query_whois(domain, timeout=None):
+  """Registration date as whois tells it, None if it does not, UNKNOWN if
+  it takes longer than timeout, waiting for a free thread included."""
+  timeout = timeout or TIMEOUT
+  deadline = time.monotonic() + timeout
+  loop = asyncio.get_event_loop()
+  try:
+    out = await asyncio.wait_for(loop.run_in_executor(_executor, _run_whois, domain, deadline), timeout)
+  except asyncio.TimeoutError:
+    out = None
+  except OSError as exc: # no whois binary
+    logger.error("Running {} failed: {}".format(WHOIS_BINARY, exc))
+    return None
+  if out is None:
+    logger.warning("Whois for {} timed out after {}s".format(domain, timeout))
+    return UNKNOWN
+  return parse_creation_date(out.decode("utf-8", "replace"))
+
+def cached_date_registered(domain, cache=None):
+  """(True, date) for a cached lookup, date being None if it failed, else (False, None)"""
+  entry = (cache or whois_cache()).get("whois:" + domain)
+  if entry is None:
+    return False, None
+  stored, date = entry
+  ttl = UNKNOWN_TTL if date == UNKNOWN else FAILURE_TTL if date is None else TTL
+  if time.time() - stored > ttl:
+    return False, None
+  return True, date
+
+async def awhois_date_registered(domain, cache=None):
+  """Registration date, None if whois does not know it, or UNKNOWN"""
+  cache = cache or whois_cache()
+  found, date = cached_date_registered(domain, cache)
+  if not found:
+    date = await query_whois(domain)
+    cache.set("whois:" + domain, (time.time(), date))
+  return date
+
+def whois_date_registered(domain, cache=None):
+  """awhois_date_registered for callers without an event loop"""
+  loop = asyncio.new_event_loop()
+  try:
+    return loop.run_until_complete(awhois_date_registered(domain, cache))
+  finally:
+    loop.close()
+
+def prewarm(domains, cache=None):
+  """Look up the domains not cached yet, return how many were looked up"""
+  missing = [d for d in set(domains) if d and not cached_date_registered(d, cache)[0]]
+  async def warm():
+    batch = asyncio.Semaphore(CONCURRENCY) # rather than timing out waiting for a thread
+    async def one(domain):
+      async with batch:
+        await awhois_date_registered(domain, cache)
+    await asyncio.gather(*[one(domain) for domain in missing])
+
+  loop = asyncio.new_event_loop()
+  try:
+    loop.run_until_complete(warm())
+  finally:
+    loop.close()
+  return len(missing)
+
+if __name__ == "__main__":
+  with open(sys.argv[1]) as f:
+    domains = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+  print("Looked up {} of {} domains".format(prewarm(domains), len(set(domains))))
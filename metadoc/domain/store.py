@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Blacklists too large for blacklists.py, in a compact binary file that
+workers map into memory. Entries are 64-bit hashes of the domains, sorted,
+each with a bitmap of the lists naming it:
+
+  header   b"MDBL", version, number of lists, number of entries
+  names    the list names, JSON, length prefixed
+  entries  (hash, bitmap) as little-endian uint64 pairs
+
+The file is replaced atomically by build, and reopened by the workers once
+they notice, without a restart. Import plaintext or CSV feeds with
+
+  python -m metadoc.domain.store blacklists.bin propornot=propornot.txt opensources=sources.csv
+"""
+import bisect
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MDBL"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+NAMES_LENGTH = struct.Struct("<I")
+ENTRY = struct.Struct("<QQ")
+MAX_LISTS = 64 # bits of the bitmap
+
+def domain_hash(domain):
+  digest = hashlib.sha1(domain.strip().strip(".").lower().encode("utf-8")).digest()
+  return int.from_bytes(digest[:8], "little")
+
+def read_feed(path):
+  """Domains of a plaintext feed, one per line, or of the first column or
+  "domain" column of a CSV feed"""
+  with open(path, newline="") as f:
+    if not path.endswith(".csv"):
+      return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    rows = list(csv.reader(f))
+  if not rows:
+    return []
+  header = [cell.strip().lower() for cell in rows[0]]
+  column = header.index("domain") if "domain" in header else 0
+  start = 1 if "domain" in header else 0
+  return [row[column].strip() for row in rows[start:] if len(row) > column and row[column].strip()]
+
+def build(path, feeds):
+  """Write the store for feeds, domains per list name, replacing path atomically"""
+  names = sorted(feeds)
+  if len(names) > MAX_LISTS:
+    raise ValueError("At most {} lists fit a store, got {}".format(MAX_LISTS, len(names)))
+
+  bitmaps = {}
+  for bit, name in enumerate(names):
+    for domain in feeds[name]:
+      key = domain_hash(domain)
+      bitmaps[key] = bitmaps.get(key, 0) | (1 << bit)
+
+  blob = json.dumps(names).encode("utf-8")
+  fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(HEADER.pack(MAGIC, VERSION, len(names), len(bitmaps)))
+      f.write(NAMES_LENGTH.pack(len(blob)))
+      f.write(blob)
+      for key in sorted(bitmaps):
+        f.write(ENTRY.pack(key, bitmaps[key]))
+    os.replace(tmp_path, path)
+  except BaseException:
+    os.unlink(tmp_path)
+    raise
+  return len(bitmaps)
+
+class _Hashes(object):
+  """The sorted hashes of a mapped store, as a sequence for bisect"""
+  def __init__(self, buf, offset, count):
+    self.buf, self.offset, self.count = buf, offset, count
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, i):
+    return ENTRY.unpack_from(self.buf, self.offset + i * ENTRY.size)[0]
+
+class _Mapped(object):
+  """One version of the file, mapped read-only"""
+  def __init__(self, path):
+    with open(path, "rb") as f:
+      stat = os.fstat(f.fileno())
+      self.signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+      self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, lists, count = HEADER.unpack_from(self.buf, 0)
+    if magic != MAGIC or version != VERSION:
+      raise ValueError("{} is no blacklist store of version {}".format(path, VERSION))
+    length, = NAMES_LENGTH.unpack_from(self.buf, HEADER.size)
+    names_offset = HEADER.size + NAMES_LENGTH.size
+    self.sources = tuple(json.loads(self.buf[names_offset:names_offset + length].decode("utf-8")))
+    self.offset = names_offset + length
+    self.hashes = _Hashes(self.buf, self.offset, count)
+
+  def bitmap(self, domain):
+    key = domain_hash(domain)
+    i = bisect.bisect_left(self.hashes, key)
+    if i < len(self.hashes) and self.hashes[i] == key:
+      return ENTRY.unpack_from(self.buf, self.offset + i * ENTRY.size)[1]
+    return 0
+
+class BlacklistStore(object):
+  """Lookups in a store built by build, like check.BlacklistIndex.
+  :param path: Store file, reopened when replaced.
+  :param check_every: Seconds between checks whether it was replaced.
+  """
+  def __init__(self, path, check_every=10):
+    self.path = path
+    self.check_every = check_every
+    self.reloads = 0
+    self._lock = threading.Lock()
+    self._mapped = _Mapped(path)
+    self._checked = time.monotonic()
+
+  def _current(self):
+    if time.monotonic() - self._checked >= self.check_every:
+      self.reload()
+    return self._mapped
+
+  def reload(self):
+    """Reopen the file if it was replaced. Readers of the old version keep
+    their mapping until they are done with it."""
+    with self._lock:
+      self._checked = time.monotonic()
+      try:
+        stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self._mapped.signature:
+          return False
+        self._mapped = _Mapped(self.path)
+      except (OSError, ValueError) as exc:
+        logger.error("Reloading blacklist store {} failed".format(self.path))
+        logger.exception(exc)
+        return False
+      self.reloads += 1
+      return True
+
+  @property
+  def sources(self):
+    return self._current().sources
+
+  def lookup(self, host):
+    """Names of the lists with host or one of its parent domains"""
+    mapped = self._current()
+    labels = host.lower().rstrip(".").split(".")
+    bitmap = 0
+    for i in range(len(labels)):
+      bitmap |= mapped.bitmap(".".join(labels[i:]))
+    return frozenset(name for bit, name in enumerate(mapped.sources) if bitmap & (1 << bit))
+
+  def lookup_many(self, hosts):
+    return {host: self.lookup(host) for host in hosts}
+
+if __name__ == "__main__":
+  feeds = {}
+  for arg in sys.argv[2:]:
+    name, feed_path = arg.split("=", 1)
+    feeds.setdefault(name, []).extend(read_feed(feed_path))
+  print("Wrote {} domains of {} lists to {}".format(build(sys.argv[1], feeds), len(feeds), sys.argv[1]))
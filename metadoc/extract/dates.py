@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Date normalisation to ISO-8601 in UTC, at seconds precision.
+Most publisher dates are strict ISO-8601 or RFC 2822, which are read by the
+compiled patterns below; anything else goes through dateutil. Results are
+memoized per raw string, pages of a site mostly carry the same few dates.
+Naive dates are taken as local time, like dateutil + astimezone() do.
+"""
+from datetime import datetime, timedelta, timezone
+import functools
+import re
+
+from dateutil.parser import parse
+from dateutil.tz import tzoffset
+
+UTC = tzoffset(None, 0)
+
+ISO_DATE = re.compile(r'''
+  (\d{4})-(\d{2})-(\d{2})
+  (?:[T\ ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6}))?)?)?
+  (Z|[+-]\d{2}(?::?\d{2})?)?
+  $''', re.X)
+
+MONTHS = {m: i for i, m in enumerate(
+  ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+
+RFC_2822_DATE = re.compile(r'''
+  (?:(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun),\ )?
+  (\d{1,2})\ (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\ (\d{4})
+  \ (\d{2}):(\d{2})(?::(\d{2}))?
+  \ (GMT|UTC|Z|[+-]\d{4})
+  $''', re.X)
+
+def _offset(value):
+  if value is None:
+    return None
+  if value in ("Z", "GMT", "UTC"):
+    return timezone.utc
+  digits = value[1:].replace(":", "")
+  minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+  return timezone(timedelta(minutes=-minutes if value[0] == "-" else minutes))
+
+def _parse_fast(value):
+  '''Read ISO-8601 and RFC 2822 dates, None for anything else.'''
+  match = ISO_DATE.match(value)
+  if match:
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+      int(second or 0), int((fraction or "0").ljust(6, "0")), tzinfo=_offset(offset))
+
+  match = RFC_2822_DATE.match(value)
+  if match:
+    day, month, year, hour, minute, second, offset = match.groups()
+    return datetime(int(year), MONTHS[month], int(day), int(hour), int(minute),
+      int(second or 0), tzinfo=_offset(offset))
+  return None
+
+def parse_date(value):
+  '''Parse a date string, dateutil being the fallback for unusual formats.
+  :raises ValueError: If neither can read it, as dateutil does.
+  '''
+  try:
+    date = _parse_fast(value)
+  except ValueError:
+    # Out of range fields, dateutil decides
+    date = None
+  return date if date is not None else parse(value)
+
+@functools.lru_cache(maxsize=4096)
+def _normalize(value):
+  return to_utc_iso(parse_date(value))
+
+def normalize_date(date_in):
+  '''Format a date string or a datetime as UTC ISO-8601, e.g.
+  "2018-02-16T00:01:52+00:00".
+  '''
+  if isinstance(date_in, str):
+    return _normalize(date_in)
+  return to_utc_iso(date_in)
+
+def to_utc_iso(date):
+  return date.astimezone().astimezone(UTC).replace(microsecond=0).isoformat()
+
+def utc_now_iso():
+  return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
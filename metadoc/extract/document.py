@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""From response bytes to one lxml tree per page. The body is kept as bytes,
+its charset is sniffed once, and the tree parsed from it is shared by goose
+text extraction and HtmlMeta.
+"""
+import codecs
+import re
+
+import lxml.html
+from goose3.crawler import Crawler
+
+# UTF-8 encoded umlauts, which decode to Ã¤, Ã¶, Ã¼ when read as latin-1 (e.g. t3n.de)
+UTF8_UMLAUTS = re.compile(rb'\xc3[\xa4\xb6\xbc\x84\x96\x9c]')
+# UTF-8 encoded U+1F300-U+1F64F, U+1F680-U+1F6FF and flags U+1F1E0-U+1F1FF
+EMOJI = re.compile(rb'\xf0\x9f(?:[\x8c-\x98][\x80-\xbf]|\x99[\x80-\x8f]|[\x9a\x9b][\x80-\xbf]|\x87[\xa0-\xbf])')
+# Any UTF-8 encoded non-ASCII character
+UTF8_SEQUENCE = re.compile(rb'[\xc2-\xdf][\x80-\xbf]|[\xe0-\xef][\x80-\xbf]{2}|[\xf0-\xf4][\x80-\xbf]{3}')
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]*)', re.I)
+
+def _lookup(encoding):
+  '''Normalise an encoding name, None if Python does not know it.'''
+  try:
+    return codecs.lookup(encoding).name if encoding else None
+  except LookupError:
+    return None
+
+def sniff_encoding(content, declared=None):
+  '''Pick the charset to parse a page with, without decoding it.
+  :param content: Page as bytes.
+  :param declared: Charset from the Content-Type header, if any.
+  :rtype: Encoding name, or None to leave it to libxml2.
+  '''
+  encoding = _lookup(declared)
+  if encoding is None:
+    match = META_CHARSET.search(content)
+    encoding = _lookup(match.group(1).decode("ascii", "ignore")) if match else None
+
+  if encoding is None:
+    # libxml2 would assume latin-1
+    return "utf-8" if UTF8_SEQUENCE.search(content) else None
+  # Servers which label their UTF-8 pages as latin-1 are common enough
+  if encoding != "utf-8" and UTF8_UMLAUTS.search(content):
+    return "utf-8"
+  return encoding
+
+def to_bytes(html, encoding=None):
+  '''Return the page as bytes and the charset to parse them with.
+  Text is encoded once, bytes are passed through as they are.
+  '''
+  if isinstance(html, str):
+    return html.encode("utf-8"), "utf-8"
+  return html, sniff_encoding(html, encoding)
+
+def strip_emoji(content):
+  # Lxml bails out on html w/ emojis. Only copy the page if there are any
+  if b'\xf0\x9f' not in content:
+    return content
+  return EMOJI.sub(b'', content)
+
+def parse(content, encoding=None):
+  '''Parse page bytes into an lxml.html tree.'''
+  try:
+    parser = lxml.html.HTMLParser(encoding=encoding)
+  except LookupError:
+    parser = lxml.html.HTMLParser()
+  return lxml.html.fromstring(content, parser=parser)
+
+
+class TreeCrawler(Crawler):
+  '''Goose crawler working on a tree parsed beforehand, instead of parsing
+  the html itself. Goose cleans the tree in place and keeps an untouched copy
+  as ``raw_doc``.
+  '''
+
+  def __init__(self, config, tree, fetcher=None):
+    super(TreeCrawler, self).__init__(config, fetcher)
+    self.tree = tree
+
+  def get_document(self, raw_html):
+    return self.tree
+
+  def extract(self):
+    # The raw html is only used to sniff the meta charset again, cf. goose3.extractors.metas
+    return self.process("", None, "metadoc")
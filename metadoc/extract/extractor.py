@@ -1,30 +1,52 @@
 # -*- coding: utf-8 -*-
-import re
 import logging
-import lxml
 import math
 import time
 import hashlib
 
-from langdetect import detect
 from goose3 import Goose, Configuration
 
+from . import document
 from .ner import EntityExtractor
+from .dates import utc_now_iso
+from .language import detect_language, THRESHOLD
+from .suffix import registered_domain
 from .html import HtmlMeta
 
 logger = logging.getLogger(__name__)
 
 class Extractor(object):
   """Entity recognition, pullquote extraction etc.
+  :param html: Page as text, or as the response bytes.
+  :param encoding: Charset of the bytes as declared by the server, optional.
+  :param url: Article url, lets metadata extraction learn per publisher, optional.
+  :param sentence_cache: Optional cache for named entities per sentence, cf. EntityExtractor.
+  :param extract_cache: Optional cache for the results of get_all, keyed by
+    the sanitized page, cf. metadoc.cache.
+  :param cachekey: Results of a page cached before, with html None if it is
+    unchanged since, cf. metadoc.fetch.
   """
-  def __init__(self, html=None, title=" ", **kwargs):
+  RESULT_FIELDS = (
+    "title", "authors", "description", "canonical_url", "image", "published_date", "modified_date",
+    "fulltext", "language", "language_confidence", "keywords", "names", "contenthash", "reading_time",
+  )
+
+  def __init__(self, html=None, title=" ", encoding=None, url=None, sentence_cache=None,
+      extract_cache=None, cachekey=None, **kwargs):
     self.html = html or None
+    self.url = url
+    self.extract_cache = extract_cache
+    self.cachekey = cachekey
+    self.encoding = encoding
+    self.content = None
+    self.sentence_cache = sentence_cache
     self.title = title or None
     self.entities = []
     self.keywords = []
     self.names = []
     self.fulltext = None
     self.language = None
+    self.language_confidence = None
     self.description = None
     self.canonical_url = None
     self.image = None
@@ -41,43 +63,59 @@ class Extractor(object):
     self.tree = None
 
   def detect_language(self):
-    """Langdetect is non-deterministic, so to achieve a higher probability
-    we attempt detection multiple times and only report success if we get identical results.
+    """Classify the fulltext, cf. language.detect_language. A declared
+    language other than English is checked too: sites declare theirs on
+    pages in other languages. The text wins if it is certain enough.
     """
-    if self.language:
-        return
-
-    try:
-        nondet_attempts = [detect(self.fulltext) for i in range(0,2)]
-        is_unique = len(set(nondet_attempts)) == 1
-        self.language = nondet_attempts[0] if is_unique else False
-    except:
-        pass
+    declared = self.language
+    if declared and self._is_en(declared):
+      return
+
+    detected, confidence = detect_language(self.fulltext)
+    if not declared or (detected and confidence >= THRESHOLD):
+      self.language, self.language_confidence = detected, confidence
+    elif detected == declared.split("-")[0].lower(): # confirmed, if barely
+      self.language_confidence = confidence
+
+  def _is_en(self, language):
+    return language.split("-")[0].lower() == "en"
+
+  def is_english(self):
+    """Unknown languages are given the benefit of the doubt, and so are
+    those the text does not confirm with language.THRESHOLD confidence:
+    short texts full of names are often taken for another language.
+    """
+    if not self.language or self._is_en(self.language):
+      return True
+    return self.language_confidence is None or self.language_confidence < THRESHOLD
 
   def sanitize_html(self):
-    # Lxml bails out on html w/ emojis
-    emoji_pattern = re.compile("["
-        u"\U0001F600-\U0001F64F"  # emoticons
-        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-        u"\U0001F680-\U0001F6FF"  # transport & map symbols
-        u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-      "]+", flags=re.UNICODE)
-
-    self.html = emoji_pattern.sub(r'', self.html)
+    """Get the page bytes and the charset they are parsed with"""
+    content, self.encoding = document.to_bytes(self.html, self.encoding)
+    self.content = document.strip_emoji(content)
 
-    # empty charset derails goose3
-    self.html = self.html.replace('<meta charset="">', '<meta charset="utf-8">')
+  def parse_html(self):
+    """Parse once, the tree is shared by goose and HtmlMeta"""
+    self.tree = document.parse(self.content, self.encoding)
 
   def extract_text(self):
     """Parse fulltext, do keyword extraction using the newspaper lib
     => newspaper.readthedocs.io
     """
-    res = self.goose.extract(url=None, raw_html=self.html.encode("utf-8"))
+    crawler = document.TreeCrawler(self.goose.config, self.tree, fetcher=self.goose.fetcher)
+    res = crawler.extract()
+    # goose cleaned our tree in place, its copy is untouched
     self.tree = res.raw_doc
     self.fulltext = res.cleaned_text
     self.language = res.meta_lang
 
-    entities = EntityExtractor(self.fulltext)
+  def extract_entities(self):
+    """The perceptron tagger is trained on English text only"""
+    if not self.is_english():
+      logger.debug("Skipping entity extraction for language %s" % self.language)
+      return
+
+    entities = EntityExtractor(self.fulltext, cache=self.sentence_cache)
     entities.get_scored_entities() # Averaged Perceptron Tagger
     self.keywords = entities.get_keywords() # Above median?
     self.names = entities.get_names() # Filter top
@@ -85,7 +123,8 @@ class Extractor(object):
   def extract_metadata(self):
     """Sniff for essential and additional metadata via
     either metatags and or json-ld"""
-    html_meta = HtmlMeta(self.html, tree=self.tree)
+    domain = registered_domain(self.url) if self.url else None
+    html_meta = HtmlMeta(self.content, tree=self.tree, domain=domain)
     html_meta.extract()
 
     # data
@@ -112,12 +151,43 @@ class Extractor(object):
     wordcount = len(self.fulltext.split())
     self.reading_time = math.floor(wordcount / 300 * 60)
 
+  def get_cachekey(self):
+    """The same page gives the same results, until metadoc is updated"""
+    from metadoc import __version__ # importing metadoc imports us
+    digest = hashlib.sha1(self.content)
+    digest.update(__version__.encode("utf-8"))
+    return "extract:" + digest.hexdigest()
+
+  def load_cached(self, key):
+    cached = self.extract_cache.get(key)
+    if cached is None:
+      return False
+    for field, value in cached.items():
+      setattr(self, field, value)
+    self.scraped_date = utc_now_iso()
+    return True
+
   def get_all(self):
     start_time = time.time()
+    if self.html is None and self.cachekey is not None: # not modified
+      if not self.load_cached(self.cachekey):
+        raise ValueError("Cached extraction of unmodified page is gone.")
+      return
+
     self.sanitize_html()
+    if self.extract_cache is not None:
+      self.cachekey = self.get_cachekey()
+      if self.load_cached(self.cachekey):
+        logger.debug("--- extraction module cached %s seconds ---" % (time.time() - start_time))
+        return
+
+    self.parse_html()
     self.extract_text()
-    self.extract_metadata()
     self.detect_language()
+    self.extract_entities()
+    self.extract_metadata()
     self.get_contenthash()
     self.get_reading_time()
+    if self.extract_cache is not None:
+      self.extract_cache.set(self.cachekey, {field: getattr(self, field, None) for field in self.RESULT_FIELDS})
     logger.debug("--- extraction module %s seconds ---" % (time.time() - start_time))
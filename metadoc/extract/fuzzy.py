@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Near-duplicate lookups for keyword and name candidates, cf. EntityExtractor.
+Gives the results of difflib.get_close_matches without scoring every pair.
+"""
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from difflib import SequenceMatcher
+import math
+import numpy
+
+EMPTY = numpy.zeros(0, dtype=numpy.int64)
+
+def _lcs(positions, length, other):
+  '''Length of the longest common subsequence of a word and other, bit-parallel
+  (Hyyro 2004). positions maps each character to the bitmask of its indices
+  in the word, of the given length.'''
+  full = (1 << length) - 1
+  v = full
+  for char in other:
+    u = v & positions.get(char, 0)
+    v = ((v + u) | (v - u)) & full
+  return length - bin(v).count("1")
+
+class FuzzyMatcher(object):
+  '''Closest-match lookups over a fixed set of strings.
+  ``best_match(word)`` equals ``difflib.get_close_matches(word, words, 2)[1:]``.
+  Candidates are narrowed down to a length window, then to the words sharing
+  one of the rarest characters of the query, cf. _prefix, looked up in an
+  inverted index. The survivors are bounded by their character multiset
+  overlap (SequenceMatcher.quick_ratio), then by their longest common
+  subsequence, and scored best bound first, stopping as soon as no
+  remaining candidate can beat the best score found.
+  :param words: Candidate strings.
+  :param cutoff: Minimum SequenceMatcher ratio of a match, as in difflib.
+  '''
+
+  def __init__(self, words, cutoff=0.6):
+    self.cutoff = cutoff
+    self.words = sorted(set(words), key=len)
+    self._length_list = [len(w) for w in self.words] # for bisect
+    self.lengths = numpy.array(self._length_list, dtype=numpy.int64)
+
+    self.alphabet = {}
+    for word in self.words:
+      for char in word:
+        self.alphabet.setdefault(char, len(self.alphabet))
+
+    self.counts = numpy.zeros((len(self.words), len(self.alphabet)), dtype=numpy.int32)
+    for row, word in enumerate(self.words):
+      for char in word:
+        self.counts[row, self.alphabet[char]] += 1
+
+    # (char, n) -> rows of the words with n or more of char, ascending
+    postings = {}
+    for row, word in enumerate(self.words):
+      for char, count in Counter(word).items():
+        for n in range(1, count + 1):
+          postings.setdefault((char, n), []).append(row)
+    self.postings = {token: numpy.array(rows, dtype=numpy.int64) for token, rows in postings.items()}
+
+  def _window(self, length):
+    '''Index range of words whose length allows a ratio >= cutoff.'''
+    shortest = math.floor(length * self.cutoff / (2 - self.cutoff))
+    longest = math.ceil(length * (2 - self.cutoff) / self.cutoff)
+    return bisect_left(self._length_list, shortest), bisect_right(self._length_list, longest)
+
+  def _shared(self, total):
+    '''Fewest shared characters for a ratio >= cutoff at a total length.'''
+    shared = math.ceil(self.cutoff * total / 2)
+    while shared > 0 and 2.0 * (shared - 1) / total >= self.cutoff:
+      shared -= 1
+    return shared
+
+  def _prefix(self, word, lo, hi):
+    '''Rows in lo:hi that may reach the cutoff. A word needs _shared
+    characters in common with the query, so it has one of the query's
+    len(word) - _shared + 1 rarest characters or misses the cutoff. Longer
+    words need more, the rarest characters are looked up for all lengths,
+    the next ones for ever shorter words only.'''
+    if self.cutoff <= 0:
+      return numpy.arange(lo, hi)
+
+    tokens = [(char, n) for char, count in Counter(word).items() for n in range(1, count + 1)]
+    tokens.sort(key=lambda token: len(self.postings.get(token, EMPTY)))
+    ends = [lo] * len(tokens) # rows up to which to look up each token
+    for length in range(self._length_list[lo], self._length_list[hi - 1] + 1):
+      end = bisect_right(self._length_list, length, lo, hi)
+      for i in range(len(word) - self._shared(len(word) + length) + 1):
+        ends[i] = end
+
+    hit = numpy.zeros(hi - lo, dtype=bool)
+    for token, end in zip(tokens, ends):
+      posting = self.postings.get(token, EMPTY)
+      if end > lo and len(posting):
+        hit[posting[numpy.searchsorted(posting, lo):numpy.searchsorted(posting, end)] - lo] = True
+    return lo + numpy.flatnonzero(hit)
+
+  def best_match(self, word):
+    '''Return the closest other word with a ratio >= cutoff, or None.
+    Ties go to the larger string, like difflib.get_close_matches.
+    '''
+    if not word or not self.words:
+      return None
+
+    lo, hi = self._window(len(word))
+    if lo >= hi:
+      return None
+    rows = self._prefix(word, lo, hi)
+    chars = Counter(char for char in word if char in self.alphabet)
+    cols = [self.alphabet[char] for char in chars]
+    query = numpy.array(list(chars.values()), dtype=numpy.int32)
+
+    # Same float arithmetic as real_quick_ratio and quick_ratio
+    lengths = self.lengths[rows]
+    total = lengths + len(word)
+    real_quick = 2.0 * numpy.minimum(lengths, len(word)) / total
+    quick = 2.0 * numpy.minimum(self.counts[rows][:, cols], query).sum(axis=1) / total
+    candidates = numpy.flatnonzero((real_quick >= self.cutoff) & (quick >= self.cutoff))
+
+    matcher = SequenceMatcher()
+    matcher.set_seq2(word)
+    positions = {}
+    for i, char in enumerate(word):
+      positions[char] = positions.get(char, 0) | (1 << i)
+    best = None
+
+    for i in candidates[numpy.argsort(-quick[candidates], kind="stable")]:
+      # ratio never exceeds quick_ratio, nothing left can win
+      if best is not None and quick[i] < best[0]:
+        break
+      candidate = self.words[rows[i]]
+      if candidate == word:
+        continue
+      # the matching blocks are a common subsequence, at most the longest
+      bound = 2.0 * _lcs(positions, len(word), candidate) / total[i]
+      if bound < self.cutoff or (best is not None and bound < best[0]):
+        continue
+      matcher.set_seq1(candidate)
+      score = matcher.ratio()
+      if score >= self.cutoff and (best is None or (score, candidate) > best):
+        best = (score, candidate)
+
+    return best[1] if best else None
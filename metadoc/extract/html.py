@@ -1,52 +1,113 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import functools
+import itertools
 import json
 import logging
-import lxml.etree, lxml.html
-from datetime import datetime
-from dateutil.parser import parse
-from dateutil.tz import tzoffset
 from collections import ChainMap
 
+from . import document
+from .dates import normalize_date, utc_now_iso
+from . import rules as rule_tables
+
 logger = logging.getLogger(__name__)
 
+def memoized(method):
+    """Read-only property computed once per extract(), cf. HtmlMeta"""
+    @functools.wraps(method)
+    def getter(self):
+        if not self._harvested:
+            self.extract()
+        name = method.__name__
+        if name not in self._memo:
+            self._memo[name] = method(self)
+        return self._memo[name]
+    return property(getter)
+
 class HtmlMeta(object):
     """Extract metadata from html.
     Needs work, e.g. handling multiple @property=author tags,
     detect if author content is a social media destination.
+    :param html: Page as text or bytes.
+    :param encoding: Declared charset of the bytes, sniffed if missing.
+    :param tree: Tree already parsed from html, skips parsing.
+    :param head_only: Only harvest metadata from <head>, plus <time> and
+        itemprop nodes of the body. Faster, but misses JSON-LD in the body.
+    :param domain: Registered domain of the page, to look up and learn which
+        rules match for this publisher, cf. rules.RuleTable.
+    :param rules: RuleTable to use with domain, defaults to the shared one.
+    :param learn: Record the rules which matched, off for partial documents.
     """
-    def __init__(self, html, encoding="UTF-8", tree=None):
+    HEAD_TAGS = ("title", "meta", "link", "script")
+    BODY_TAGS = ("time", "span")
+
+    # (tag, attribute, value) of the nodes holding a date, by precedence
+    PUBLISHED_DATES = [
+        ("meta", "name", "date"),
+        ("meta", "property", "article:published_time"),
+        ("meta", "property", "article:published"),
+        ("meta", "name", "parsely-pub-date"),
+        ("meta", "name", "DC.date.issued"),
+        ("time", "itemprop", "datePublished"),
+    ]
+    MODIFIED_DATES = [
+        ("meta", "property", "article:modified_time"),
+        ("meta", "property", "article:modified"),
+        ("meta", "name", "last-modified"),
+    ]
+    DATE_RULES = frozenset(PUBLISHED_DATES + MODIFIED_DATES)
+    # JSON-LD keys, tried after the nodes above
+    PUBLISHED_LD = ["datePublished", "dateCreated"]
+    MODIFIED_LD = ["dateModified"]
+
+    AUTHOR_RULES = [
+        "ld:author",
+        "meta:author",
+        "meta:article:author",
+        "meta:dcterms.creator",
+        "meta:article:authorName",
+        "meta:citation_author",
+        "ld:authors", # intercept
+    ]
+
+    def __init__(self, html, encoding=None, tree=None, head_only=False, domain=None, rules=None,
+            learn=True):
         self.html = html or None
+        self.head_only = head_only
+        self.domain = domain
+        self.rules = rules if rules is not None else rule_tables.rules
+        self.learn = learn
         if tree is not None:
             # reuse tree already parsed
             self.document = tree
         else:
-            self.parser = lxml.html.HTMLParser(encoding=encoding)
-            self.document = lxml.html.fromstring(html, parser=self.parser)
-        self._jsonld_xpath = lxml.etree.XPath('descendant-or-self::script[@type="application/ld+json"]')
-        self._metatag_xpath = lxml.etree.XPath("//meta")
-        self._links_xpath = lxml.etree.XPath("//link")
+            self.document = document.parse(*document.to_bytes(html, encoding))
 
         self.links = {}
         self.jsonld = {}
         self.metatags = {}
+        self.dates = {}
+        self._title_node = None
+        self._author_node = None
+        self._harvested = False
+        self._memo = {}
 
-    @property
+    @memoized
     def title(self):
         return self.jsonld.get("headline") \
             or self.metatags.get("og:title") \
                 or self.extract_title()
 
-    @property
+    @memoized
     def description(self):
         return self.metatags.get("og:description") \
             or self.metatags.get("description", "").strip()
 
-    @property
+    @memoized
     def canonical_url(self):
         return self.links.get("canonical")
 
-    @property
+    @memoized
     def image(self):
         return self.metatags.get("og:image") \
             or self.jsonld.get("thumbnailUrl")
@@ -66,16 +127,43 @@ class HtmlMeta(object):
         ld_authors = [a["name"] for a in ld_authors] if type(ld_authors) == list else ld_authors.get("name", False)
         return ld_authors
 
-    @property
+    def _rule_name(self, rule):
+        return rule if isinstance(rule, str) else "{}[@{}='{}']".format(*rule)
+
+    def _first_match(self, field, rules, lookup):
+        """Value of the first rule with a truthy result. The rule which matched
+        on the last page of the same domain is tried first.
+        """
+        learned = self.rules.get(self.domain, field) if self.domain else None
+        if learned is not None:
+            for rule in rules:
+                if self._rule_name(rule) == learned:
+                    value = lookup(rule)
+                    if value:
+                        return value
+                    break
+
+        for rule in rules:
+            name = self._rule_name(rule)
+            if name == learned:
+                continue
+            value = lookup(rule)
+            if value:
+                if self.domain and self.learn:
+                    self.rules.hit(self.domain, field, name)
+                return value
+        return None
+
+    def _author_rule(self, rule):
+        source, key = rule.split(":", 1)
+        if source == "ld":
+            return self._extract_ld_authors() if key == "author" else self.jsonld.get(key)
+        return self.metatags.get(key)
+
+    @memoized
     def authors(self):
         # get a value from trove
-        authors = self._extract_ld_authors() \
-            or self.metatags.get("author") \
-                or self.metatags.get("article:author") \
-                    or self.metatags.get("dcterms.creator") \
-                        or self.metatags.get("article:authorName") \
-                            or self.metatags.get("citation_author") \
-                                or self.jsonld.get("authors") # intercept
+        authors = self._first_match("authors", self.AUTHOR_RULES, self._author_rule)
 
         if authors:
             # ensure list
@@ -84,73 +172,97 @@ class HtmlMeta(object):
             # strip links
             authors = [a for a in authors if a.startswith("http") == False]
 
-        if not authors:
+        if not authors and self._author_node is not None:
             # washingtonpost
-            xauthors = self.document.xpath("(//span[@itemprop='author'])[1]//span[@itemprop='name']/text()")
+            xauthors = self._author_node.xpath(".//span[@itemprop='name']/text()", smart_strings=False)
             if xauthors:
                 authors = xauthors
 
         return authors if authors else []
 
-    @property
+    def _date_rule(self, rule):
+        if isinstance(rule, str):
+            ld_date = self.jsonld.get(rule)
+            return self._format_date(ld_date) if ld_date else None
+
+        date = self.dates.get(rule)
+        if date is not None:
+            try:
+                return self._format_date(str(date))
+            except:
+                pass
+        return None
+
+    @memoized
     def published_date(self):
-        res = None
-        xpaths = [
-            "//meta[@name='date']/@content",
-            "//meta[@property='article:published_time']/@content",
-            "//meta[@property='article:published']/@content",
-            "//meta[@name='parsely-pub-date']/@content",
-            "//meta[@name='DC.date.issued']/@content",
-            "//time[@itemprop='datePublished']/@datetime",
-        ]
-        res = self._query_date(xpaths)
-        if res is None:
-            ld_date = self.jsonld.get("datePublished") or self.jsonld.get("dateCreated")
-            if ld_date:
-                res = self._format_date(ld_date)
-        return res
+        return self._first_match("published_date", self.PUBLISHED_DATES + self.PUBLISHED_LD, self._date_rule)
 
-    @property
+    @memoized
     def modified_date(self):
-        res = None
-        xpaths = [
-            "//meta[@property='article:modified_time']/@content",
-            "//meta[@property='article:modified']/@content",
-            "//meta[@name='last-modified']/@content",
-        ]
-        res = self._query_date(xpaths)
-        if res is None:
-            ld_date = self.jsonld.get("dateModified")
-            if ld_date:
-                res = self._format_date(ld_date)
-        return res
+        return self._first_match("modified_date", self.MODIFIED_DATES + self.MODIFIED_LD, self._date_rule)
 
     @property
     def scraped_date(self):
-        return self._format_date(datetime.now())
+        return utc_now_iso()
 
-    def extract(self):
-        self.metatags = self._extract_items(self._get_metatag_item, self._metatag_xpath)
-        self.jsonld = self._extract_items(self._get_jsonld_item, self._jsonld_xpath)
-        self.links = self._extract_items(self._get_link_item, self._links_xpath)
-
-    def _extract_items(self, get_item, xpath):
-        items = [item for item in map(get_item, xpath(self.document)) if item]
-        return dict(ChainMap(*items))
-
-    def _get_metatag_item(self, node):
-        name = node.xpath('@property') or node.xpath('@itemprop') or node.xpath('@name')
-        content = node.xpath('@content')
+    def _iter_nodes(self):
+        if not self.head_only:
+            return self.document.iter(*(self.HEAD_TAGS + self.BODY_TAGS))
+        head = self.document.find("head")
+        body = self.document.find("body")
+        return itertools.chain(
+            head.iter(*self.HEAD_TAGS) if head is not None else (),
+            body.iter(*self.BODY_TAGS) if body is not None else ())
 
-        return {name[0]: content[0]} \
-          if (name and content) else None
+    def extract(self):
+        """Fill all lookup tables in a single pass over the tree.
+        The first occurrence of a name wins, in document order.
+        """
+        metatags, links, dates, jsonld = {}, {}, {}, []
+        self._title_node = self._author_node = None
 
-    def _get_link_item(self, node):
-        name = node.xpath('@rel')
-        content = node.xpath('@href')
+        for node in self._iter_nodes():
+            tag, attrib = node.tag, node.attrib
+            if tag == "meta":
+                content = attrib.get("content")
+                if content is None:
+                    continue
+                name = attrib.get("property")
+                if name is None:
+                    name = attrib.get("itemprop")
+                if name is None:
+                    name = attrib.get("name")
+                if name is not None:
+                    metatags.setdefault(name, content)
+                for attr in ("name", "property"):
+                    key = (tag, attr, attrib.get(attr))
+                    if key in self.DATE_RULES:
+                        dates.setdefault(key, content)
+            elif tag == "link":
+                rel, href = attrib.get("rel"), attrib.get("href")
+                if rel is not None and href is not None:
+                    links.setdefault(rel, href)
+            elif tag == "script":
+                if attrib.get("type") == "application/ld+json":
+                    item = self._get_jsonld_item(node)
+                    if item:
+                        jsonld.append(item)
+            elif tag == "time":
+                key = (tag, "itemprop", attrib.get("itemprop"))
+                if key in self.DATE_RULES and attrib.get("datetime") is not None:
+                    dates.setdefault(key, attrib.get("datetime"))
+            elif tag == "span":
+                if self._author_node is None and attrib.get("itemprop") == "author":
+                    self._author_node = node
+            elif tag == "title" and self._title_node is None:
+                self._title_node = node
 
-        return {name[0]: content[0]} \
-          if (name and content) else None
+        self.metatags = metatags
+        self.links = links
+        self.dates = dates
+        self.jsonld = dict(ChainMap(*jsonld))
+        self._memo = {}
+        self._harvested = True
 
     def _get_jsonld_item(self, node):
         ld = None
@@ -170,20 +282,12 @@ class HtmlMeta(object):
         return ld if ld else {}
 
     def extract_title(self):
-        title = self.document.xpath("(//title)[1]//text()")
+        if not self._harvested:
+            self.extract()
+        if self._title_node is None:
+            return None
+        title = self._title_node.xpath(".//text()", smart_strings=False)
         return title[0] if len(title) else None
 
     def _format_date(self, date_in):
-        date = parse(date_in) if type(date_in) is str else date_in
-        return date.astimezone().astimezone(
-                    tzoffset(None, 0)).replace(microsecond=0).isoformat()
-
-    def _query_date(self, xpath_rules):
-        for xpath_rule in xpath_rules:
-            dates = self.document.xpath(xpath_rule)
-            if len(dates) > 0:
-                try:
-                    return self._format_date(str(dates[0]))#.get("content"))
-                except:
-                    pass
-        return None
+        return normalize_date(date_in)
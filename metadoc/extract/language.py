@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Deterministic language identification. Langdetect samples n-grams at
+random, so the shared detector factory is seeded, cf. registry. Only a
+bounded prefix of the text is classified: it starts small and doubles
+until the top language is certain enough or the sample limit is reached.
+"""
+from langdetect.lang_detect_exception import LangDetectException
+
+from .registry import registry
+
+SAMPLE_SIZE = 1000 # characters
+MAX_SAMPLE_SIZE = 8000
+THRESHOLD = 0.95
+
+def detect_language(text, sample_size=SAMPLE_SIZE, max_sample_size=MAX_SAMPLE_SIZE, threshold=THRESHOLD):
+  '''Identify the language of `text`.
+  :param threshold: Stop growing the sample once the top probability reaches it.
+  :rtype: (ISO 639-1 code, probability), or (None, 0.0) if there is nothing to classify.
+  '''
+  if not text or not text.strip():
+    return None, 0.0
+
+  factory = registry.get("language_profiles")
+  limit = min(len(text), max_sample_size)
+  size = min(sample_size, limit)
+  result = (None, 0.0)
+
+  while True:
+    detector = factory.create()
+    detector.append(text[:size])
+    try:
+      best = detector.get_probabilities()[0]
+    except (LangDetectException, IndexError):
+      # No features in this sample, a longer one might still have some
+      best = None
+
+    if best is not None:
+      result = (best.lang, best.prob)
+      if best.prob >= threshold:
+        break
+    if size >= limit:
+      break
+    size = min(size * 2, limit)
+
+  return result
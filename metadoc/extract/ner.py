@@ -11,14 +11,15 @@ if os.environ.get("LAMBDA_TASK_ROOT", False):
     sys.modules["sqlite3.dbapi2"] = imp.new_module("sqlite.dbapi2")
 import nltk
 
-import difflib
+import hashlib
 import operator
 import numpy
 import string
 import re
 
 from nltk.tokenize import RegexpTokenizer
-from .pos import AveragedPerceptronTagger
+from .fuzzy import FuzzyMatcher
+from .registry import registry
 
 tokenizer = RegexpTokenizer(r'\w+')
 
@@ -31,12 +32,18 @@ def isPunct(word):
   return re.search(pattern, word) is not None
 
 class EntityExtractor(object):
-  def __init__(self, text):
-    self.perceptron_tagger = AveragedPerceptronTagger(autoload=True)
-    self.stopwords = set(nltk.corpus.stopwords.words())
+  """Named entities and keywords of a text.
+  :param cache: Optional cache for per-sentence entities, e.g. metadoc.cache.LRUCache.
+  Boilerplate sentences recurring across articles are tagged once.
+  """
+  def __init__(self, text, cache=None):
+    # shared, process-wide instances, see registry.py
+    self.perceptron_tagger = registry.get("tagger")
+    self.stopwords = registry.get("stopwords")
     self.top_fraction = 70 # consider top candidate keywords only
-    self.sent_detector = nltk.data.load('tokenizers/punkt/english.pickle')
+    self.sent_detector = registry.get("sent_detector")
     self.sentences = self.sent_detector.tokenize(text)
+    self.cache = cache
 
   def _calculate_word_scores(self, word_list):
     """Quick and dirty, inspired by Sujit Pal's RAKE implementation.
@@ -53,16 +60,16 @@ class EntityExtractor(object):
   #   return {k: v for k, v in word_scores.items() if v > median}
 
   def _filter_distance(self, words):
-    close_matches = []
-    wordlist = set(words[:]) # deepcopy
+    close_matches = set()
+    matcher = FuzzyMatcher(words) # same matches as difflib.get_close_matches
 
     for word in words:
       if word in close_matches: continue
-      matches = difflib.get_close_matches(word, wordlist, 2)
-      if len(matches) > 1:
-        close_matches += matches[1:]
+      match = matcher.best_match(word)
+      if match is not None:
+        close_matches.add(match)
 
-    return wordlist.difference(close_matches)
+    return set(words).difference(close_matches)
 
   def _sort_and_filter(self, word_scores):
     n_words = len(word_scores)
@@ -76,13 +83,29 @@ class EntityExtractor(object):
     filtered = [word.lower() in self.stopwords for word in ent.split(" ")]
     return True in filtered
 
+  def _sentence_key(self, sent):
+    normalized = " ".join(sent.split())
+    return "ner:" + hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
   def get_scored_entities(self):
     named_ents = []
+    sent_ents = [None] * len(self.sentences)
+
+    if self.cache is not None:
+      keys = [self._sentence_key(sent) for sent in self.sentences]
+      sent_ents = [self.cache.get(key) for key in keys]
 
-    for sent in self.sentences:
-      pos_tags = self.perceptron_tagger.tag(" ".join(nltk.word_tokenize(sent)))
+    # only tag sentences we haven't seen before
+    missing = [i for i, ents in enumerate(sent_ents) if ents is None]
+    tokenized = [nltk.word_tokenize(self.sentences[i]) for i in missing]
+    for i, pos_tags in zip(missing, self.perceptron_tagger.tag_sents(tokenized)):
       entities = self.perceptron_tagger.named_entities(pos_tags)
-      named_ents += [ent for ent in entities if not self._contains_stopword(ent)]
+      sent_ents[i] = [ent for ent in entities if not self._contains_stopword(ent)]
+      if self.cache is not None:
+        self.cache.set(keys[i], sent_ents[i])
+
+    for entities in sent_ents:
+      named_ents += entities
 
     ent_scores = self._calculate_word_scores(named_ents)
     self.ent_scores = ent_scores
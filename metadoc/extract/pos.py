@@ -4,11 +4,15 @@ efficiency. Adapted from @hankcs, cf. https://github.com/hankcs/AveragedPerceptr
 Based on http://honnibal.wordpress.com/2013/09/11/a-good-part-of-speechpos-tagger-in-about-200-lines-of-python/
 """
 from collections import defaultdict
+import numpy
 import pickle
 import random
 import logging
 import os
 
+from .modelfile import is_model_file, read_model, write_model
+
+MODEL = os.path.join(os.path.dirname(__file__), "data/tagger.bin")
 PICKLE = os.path.join(os.path.dirname(__file__), "data/tagger.pickle")
 TRAINING_SET = os.path.join(os.path.dirname(__file__), "data/training_set.txt")
 
@@ -33,7 +37,7 @@ def do_train():
 
   logger.info('training corpus size : %d', len(training_data))
   logger.info('Start training...')
-  tagger.train(training_data, save_loc=PICKLE)
+  tagger.train(training_data, save_loc=MODEL)
 
 class AveragedPerceptron(object):
   '''An averaged perceptron, as implemented by Matthew Honnibal.
@@ -56,12 +60,12 @@ class AveragedPerceptron(object):
   def predict(self, features):
     '''Dot-product the features and current weights and return the best label.'''
     scores = defaultdict(float)
-    for feat, value in features.items():
-      if feat not in self.weights or value == 0:
+    for feat in features:
+      weights = self.weights.get(feat)
+      if not weights:
         continue
-      weights = self.weights[feat]
       for label, weight in weights.items():
-        scores[label] += value * weight
+        scores[label] += weight
     # Do a secondary alphabetic sort, for stability
     return max(self.classes, key=lambda label: (scores[label], label))
 
@@ -105,46 +109,191 @@ class AveragedPerceptron(object):
   #   self.weights = pickle.load(open(path))
   #   return None
 
+class FeatureEncoder(object):
+  '''Map the tagger's feature templates to dense integer feature ids.
+  Each template has its own vocabulary, keyed by the raw context value(s),
+  so no feature strings are built per token. Ids are assigned while training
+  and stored alongside the model, unknown features are dropped at inference.
+  '''
+  TEMPLATES = (
+    'bias', 'i suffix', 'i pref1', 'i-1 tag', 'i-2 tag', 'i tag+i-2 tag',
+    'i word', 'i-1 tag+i word', 'i-1 word', 'i-1 suffix', 'i-2 word',
+    'i+1 word', 'i+1 suffix', 'i+2 word'
+  )
+  PAIRED = ('i tag+i-2 tag', 'i-1 tag+i word')
+
+  def __init__(self, vocab=None):
+    self.vocab = vocab or [{} for template in self.TEMPLATES]
+    self.size = sum(len(table) for table in self.vocab)
+
+  def encode(self, i, word, context, prev, prev2, grow=False):
+    '''Return the feature ids for token `i`, ``i`` already offset by START.
+    :param grow: Assign ids to unseen features, used while training.
+    '''
+    keys = (
+      '', word[-3:], word[0], prev, prev2, (prev, prev2),
+      context[i], (prev, context[i]), context[i - 1], context[i - 1][-3:],
+      context[i - 2], context[i + 1], context[i + 1][-3:], context[i + 2]
+    )
+    features = []
+    for table, key in zip(self.vocab, keys):
+      feat = table.get(key)
+      if feat is None:
+        if not grow:
+          continue
+        feat = table[key] = self.size
+        self.size += 1
+      features.append(feat)
+    return features
+
+  @classmethod
+  def from_features(cls, features):
+    '''Rebuild the vocabulary from (template id, value, value2) rows.'''
+    vocab = [{} for template in cls.TEMPLATES]
+    paired = [cls.TEMPLATES.index(name) for name in cls.PAIRED]
+    for feat, (tid, value, value2) in enumerate(features):
+      vocab[tid][(value, value2) if tid in paired else value] = feat
+    return cls(vocab)
+
+  def features(self):
+    '''List (template id, value, value2) by feature id, cf. from_features.'''
+    rows = [None] * self.size
+    for tid, table in enumerate(self.vocab):
+      for key, feat in table.items():
+        rows[feat] = (tid,) + key if type(key) is tuple else (tid, key, '')
+    return rows
+
+  def prune(self, weights):
+    '''Drop features without weights and renumber the remaining ids densely.
+    Returns the weights table re-keyed with the new ids.
+    '''
+    pruned, vocab, size = {}, [], 0
+    for table in self.vocab:
+      kept = {}
+      for key, feat in table.items():
+        if weights.get(feat):
+          kept[key] = size
+          pruned[size] = weights[feat]
+          size += 1
+      vocab.append(kept)
+    self.vocab, self.size = vocab, size
+    return pruned
+
+  def convert_legacy(self, weights):
+    '''Re-key a weights table using the former space-joined string features.'''
+    templates = sorted(enumerate(self.TEMPLATES), key=lambda t: len(t[1]), reverse=True)
+    converted = {}
+    for feat, label_weights in weights.items():
+      for tid, name in templates:
+        if feat == name:
+          key = ''
+        elif feat.startswith(name + ' '):
+          key = feat[len(name) + 1:]
+          if name in self.PAIRED:
+            key = tuple(key.split(' ', 1))
+        else:
+          continue
+        table = self.vocab[tid]
+        if key not in table:
+          table[key] = self.size
+          self.size += 1
+        converted[table[key]] = label_weights
+        break
+    return converted
+
+class CompactPerceptron(object):
+  '''Read-only, array-backed layout of a trained AveragedPerceptron.
+  Row ``n`` of a dense (features x classes) weight matrix holds the weights
+  of feature id ``n``, so prediction is a row gather-and-sum plus an argmax.
+  '''
+
+  def __init__(self, weights, classes):
+    self.weights = weights
+    # Classes are sorted in reverse, so argmax picking the first maximum
+    # reproduces the secondary alphabetic sort of AveragedPerceptron.predict
+    self.classes = classes
+
+  @classmethod
+  def from_weights(cls, weights, classes, n_features=None):
+    '''Convert a dict-of-dicts weights table, as found in the model pickle.'''
+    classes = sorted(classes, reverse=True)
+    columns = {label: col for col, label in enumerate(classes)}
+    n_features = n_features or max(weights, default=-1) + 1
+    matrix = numpy.zeros((n_features, len(classes)), dtype=numpy.float64)
+
+    for feat, label_weights in weights.items():
+      for label, weight in label_weights.items():
+        matrix[feat, columns[label]] = weight
+
+    return cls(matrix, classes)
+
+  def predict(self, features):
+    '''Sum the weight rows of the given feature ids and return the best label.'''
+    # Reducing over rows adds them in feature order, matching the float
+    # arithmetic of AveragedPerceptron.predict exactly (unlike a BLAS dot)
+    scores = self.weights[features].sum(axis=0)
+    return self.classes[int(scores.argmax())]
+
 class AveragedPerceptronTagger(object):
   '''Greedy Averaged Perceptron tagger, as implemented by Matthew Honnibal.
-  :param load: Load the pickled model upon instantiation.
+  :param load: Load the model file upon instantiation.
+  :param compact: Convert a loaded pickle into a CompactPerceptron,
+    faster, but read-only. Binary model files always load compact.
   '''
   START = ['-START-', '-START2-']
   END = ['-END-', '-END2-']
-  AP_MODEL_LOC = PICKLE
+  AP_MODEL_LOC = MODEL
 
-  def __init__(self, autoload=False):
+  def __init__(self, autoload=False, compact=False):
     self.model = AveragedPerceptron()
+    self.encoder = FeatureEncoder()
     self.tagdict = {}
     self.classes = set()
 
     if autoload:
-      self.load(self.AP_MODEL_LOC)
+      loc = self.AP_MODEL_LOC
+      if not os.path.exists(loc) and os.path.exists(PICKLE):
+        loc = PICKLE # trained before the binary format
+      self.load(loc)
+      if compact:
+        self.compact()
+
+  def compact(self):
+    '''Swap the trained model for its array-backed layout.'''
+    if isinstance(self.model, CompactPerceptron):
+      return self
+    self.model = CompactPerceptron.from_weights(
+      self.model.weights, self.classes, self.encoder.size)
+    return self
 
   def tag(self, corpus):
     '''Tags a string `corpus`.'''
     # Assume untokenized corpus has \n between sentences and ' ' between words
-    s_split = lambda t: t.split('\n')
-    w_split = lambda s: s.split()
-
-    def split_sents(corpus):
-      for s in s_split(corpus):
-        yield w_split(s)
+    sentences = [s.split() for s in corpus.split('\n')]
+    return [token for tagged in self.tag_sents(sentences) for token in tagged]
+
+  def tag_sents(self, sentences):
+    '''Tag pre-tokenized `sentences`, a list of token lists, in one call.
+    These may span a whole document or many of them, as context is reset
+    at every sentence boundary.
+    :rtype: A list of [(word, tag), ...] lists, one per sentence.
+    '''
+    return [self._tag_words(words) for words in sentences]
 
+  def _tag_words(self, words):
     prev, prev2 = self.START
     tokens = []
+    context = self.START + [self._normalize(w) for w in words] + self.END
 
-    for words in split_sents(corpus):
-      context = self.START + [self._normalize(w) for w in words] + self.END
-      for i, word in enumerate(words):
-        tag = self.tagdict.get(word)
-        if not tag:
-          features = self._get_features(i, word, context, prev, prev2)
-          tag = self.model.predict(features)
+    for i, word in enumerate(words):
+      tag = self.tagdict.get(word)
+      if not tag:
+        features = self._get_features(i, word, context, prev, prev2)
+        tag = self.model.predict(features)
 
-        tokens.append((word, tag.strip()))
-        prev2 = prev
-        prev = tag
+      tokens.append((word, tag.strip()))
+      prev2 = prev
+      prev = tag
 
     return tokens
 
@@ -195,7 +344,7 @@ class AveragedPerceptronTagger(object):
         for i, word in enumerate(words):
           guess = self.tagdict.get(word)
           if not guess:
-            feats = self._get_features(i, word, context, prev, prev2)
+            feats = self._get_features(i, word, context, prev, prev2, grow=True)
             guess = self.model.predict(feats)
             self.model.update(tags[i], guess, feats)
           prev2 = prev
@@ -205,25 +354,60 @@ class AveragedPerceptronTagger(object):
       random.shuffle(sentences)
       logger.info("Iter {0}: {1}/{2}={3}".format(iter_, c, n, _pc(c, n)))
     self.model.average_weights()
+    self.model.weights = self.encoder.prune(self.model.weights)
 
-    # Pickle as a binary file
     if save_loc is not None:
-      pickle.dump((self.model.weights, self.tagdict, self.classes),
-            open(save_loc, 'wb'), -1)
+      self.save(save_loc)
+
+    return None
+
+  def save(self, loc):
+    '''Save the model, pickled if ``loc`` ends with .pickle, otherwise
+    in the flat binary format, cf. modelfile.py.
+    '''
+    if loc.endswith('.pickle'):
+      pickle.dump((self.model.weights, self.tagdict, self.classes, self.encoder.vocab),
+            open(loc, 'wb'), -1)
+      return None
 
+    model = self.model
+    if not isinstance(model, CompactPerceptron):
+      model = CompactPerceptron.from_weights(model.weights, self.classes, self.encoder.size)
+    write_model(loc, model.weights, model.classes, self.tagdict,
+      self.encoder.features(), len(FeatureEncoder.TEMPLATES))
     return None
 
   def load(self, loc=None):
-    '''Load a pickled model.'''
+    '''Load a model, either a binary model file or a pickle.'''
     try:
+      if is_model_file(loc):
+        return self._load_model_file(loc)
       w_td_c = pickle.load(open(loc, 'rb'))
     except IOError:
       raise IOError("Invalid perceptrontagger.pickle file.")
 
-    self.model.weights, self.tagdict, self.classes = w_td_c
+    if len(w_td_c) == 3:
+      # pickled before FeatureEncoder, with string features
+      weights, self.tagdict, self.classes = w_td_c
+      self.encoder = FeatureEncoder()
+      self.model.weights = self.encoder.convert_legacy(weights)
+    else:
+      self.model.weights, self.tagdict, self.classes, vocab = w_td_c
+      self.encoder = FeatureEncoder(vocab)
     self.model.classes = self.classes
     return None
 
+  def _load_model_file(self, loc):
+    data = read_model(loc)
+    if data["n_templates"] != len(FeatureEncoder.TEMPLATES):
+      raise IOError("Tagger model was trained with other features, retrain it.")
+
+    self.encoder = FeatureEncoder.from_features(data["features"])
+    self.tagdict = data["tagdict"]
+    self.classes = set(data["classes"])
+    self.model = CompactPerceptron(data["weights"], data["classes"])
+    return None
+
   def _normalize(self, word):
     '''Normalization used in pre-processing.
     - All words are lower cased
@@ -240,33 +424,13 @@ class AveragedPerceptronTagger(object):
     else:
       return word.lower()
 
-  def _get_features(self, i, word, context, prev, prev2):
-    '''Map tokens into a feature representation, implemented as a
-    {hashable: float} dict. If the features change, a new model must be
-    trained.
+  def _get_features(self, i, word, context, prev, prev2, grow=False):
+    '''Map tokens into a feature representation, implemented as a list
+    of integer feature ids, cf. FeatureEncoder.TEMPLATES. It's useful to
+    have a constant 'bias' feature, which acts sort of like a prior.
+    If the templates change, a new model must be trained.
     '''
-
-    def add(name, *args):
-      features[' '.join((name,) + tuple(args))] += 1
-
-    i += len(self.START)
-    features = defaultdict(int)
-    # It's useful to have a constant feature, which acts sort of like a prior
-    add('bias')
-    add('i suffix', word[-3:])
-    add('i pref1', word[0])
-    add('i-1 tag', prev)
-    add('i-2 tag', prev2)
-    add('i tag+i-2 tag', prev, prev2)
-    add('i word', context[i])
-    add('i-1 tag+i word', prev, context[i])
-    add('i-1 word', context[i - 1])
-    add('i-1 suffix', context[i - 1][-3:])
-    add('i-2 word', context[i - 2])
-    add('i+1 word', context[i + 1])
-    add('i+1 suffix', context[i + 1][-3:])
-    add('i+2 word', context[i + 2])
-    return features
+    return self.encoder.encode(i + len(self.START), word, context, prev, prev2, grow=grow)
 
   def _make_tagdict(self, sentences):
     '''Make a tag dictionary for single-tag words.'''
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Process-wide registry for the NLP models used by entity extraction.
+Models are loaded lazily on first access, once per process, and handed out as
+shared instances which callers must treat as read-only.
+"""
+from collections import defaultdict
+import logging
+import threading
+import time
+
+import nltk
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+
+from .pos import AveragedPerceptronTagger
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry(object):
+  '''Thread-safe, lazily initialised store of named models.
+  :param loaders: Mapping of model name to a zero-argument loader callable.
+  '''
+
+  def __init__(self, loaders=None):
+    self._loaders = dict(loaders or {})
+    self._models = {}
+    self._lock = threading.Lock()
+    # Seconds spent in each loader, and number of times a loaded model was reused
+    self.load_times = {}
+    self.hits = defaultdict(int)
+
+  def register(self, name, loader):
+    '''Add or replace a loader, dropping any instance loaded before.'''
+    with self._lock:
+      self._loaders[name] = loader
+      self._models.pop(name, None)
+      self.load_times.pop(name, None)
+
+  def get(self, name):
+    '''Return the shared instance of model `name`, loading it if necessary.'''
+    model = self._models.get(name)
+    if model is None:
+      return self._load(name)
+    self.hits[name] += 1
+    return model
+
+  def _load(self, name):
+    with self._lock:
+      # Another thread might have loaded it while we were waiting
+      if name in self._models:
+        self.hits[name] += 1
+        return self._models[name]
+      if name not in self._loaders:
+        raise KeyError("Unknown model: {}".format(name))
+
+      start_time = time.time()
+      model = self._loaders[name]()
+      self.load_times[name] = time.time() - start_time
+      self._models[name] = model
+      logger.debug("--- loaded model %s in %s seconds ---" % (name, self.load_times[name]))
+      return model
+
+  def warmup(self, names=None):
+    '''Load models ahead of the first request, e.g. before forking workers.'''
+    for name in names or list(self._loaders):
+      self.get(name)
+
+  def stats(self):
+    return {name: {
+      "loaded": name in self._models,
+      "load_time": self.load_times.get(name),
+      "hits": self.hits[name]
+    } for name in self._loaders}
+
+  def clear(self):
+    with self._lock:
+      self._models.clear()
+      self.load_times.clear()
+      self.hits.clear()
+
+
+def _load_tagger():
+  return AveragedPerceptronTagger(autoload=True, compact=True)
+
+def _load_stopwords():
+  return frozenset(nltk.corpus.stopwords.words())
+
+def _load_language_profiles():
+  factory = DetectorFactory()
+  factory.load_profile(PROFILES_DIRECTORY)
+  # Detectors draw their n-gram samples from a RNG seeded by the factory
+  factory.set_seed(0)
+  return factory
+
+def _load_sent_detector():
+  return nltk.data.load('tokenizers/punkt/english.pickle')
+
+registry = ModelRegistry({
+  "tagger": _load_tagger,
+  "stopwords": _load_stopwords,
+  "sent_detector": _load_sent_detector,
+  "language_profiles": _load_language_profiles,
+})
+
+def warmup():
+  registry.warmup()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Per publisher memory of which metadata rule matched, cf. HtmlMeta.
+Publishers use the same templates for all their articles, so the rule which
+found e.g. the published date last time is tried first on their next page.
+The table is kept in a small JSON file next to the tagger data, so it
+survives restarts. METADOC_RULES_FILE overrides its path, empty for memory only.
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+RULES_FILE = os.environ.get("METADOC_RULES_FILE",
+  os.path.join(os.path.dirname(__file__), "data", "rules.json"))
+
+class RuleTable(object):
+  '''Thread-safe mapping of (domain, field) to the name of the rule which
+  matched last, written to `path` every `save_every` changes and at exit.
+  :param path: JSON file, created if missing. None keeps the table in memory.
+  :param max_domains: Domains beyond are dropped, least recently learned first.
+  '''
+
+  def __init__(self, path=None, save_every=20, max_domains=10000):
+    self.path = path
+    self.save_every = save_every
+    self.max_domains = max_domains
+    self._table = None
+    self._changes = 0
+    self._lock = threading.Lock()
+
+  def _load(self):
+    # Called with the lock held
+    if self._table is None:
+      self._table = self._read()
+      if self.path:
+        atexit.register(self.save)
+    return self._table
+
+  def _read(self):
+    if not self.path or not os.path.exists(self.path):
+      return collections.OrderedDict()
+    try:
+      with open(self.path, "r") as f:
+        table = json.load(f, object_pairs_hook=collections.OrderedDict)
+      return table if isinstance(table, dict) else collections.OrderedDict()
+    except (IOError, ValueError) as exc:
+      logger.error("Reading rule table {} failed".format(self.path))
+      logger.exception(exc)
+      return collections.OrderedDict()
+
+  def get(self, domain, field):
+    with self._lock:
+      return self._load().get(domain, {}).get(field)
+
+  def hit(self, domain, field, rule):
+    '''Remember that `rule` matched `field` on a page of `domain`.'''
+    with self._lock:
+      table = self._load()
+      fields = table.setdefault(domain, collections.OrderedDict())
+      table.move_to_end(domain) # most recently learned last
+      if fields.get(field) == rule:
+        return
+      fields[field] = rule
+      self._evict(table)
+      self._changes += 1
+      if self._changes < self.save_every:
+        return
+    self.save()
+
+  def _evict(self, table):
+    while len(table) > self.max_domains:
+      table.popitem(last=False)
+
+  def save(self):
+    '''Write the table, merged with the entries other processes saved meanwhile.'''
+    if not self.path:
+      return
+    with self._lock:
+      if not self._changes:
+        return
+      table = self._read()
+      for domain, fields in self._table.items(): # ours are the most recent
+        table[domain] = fields
+        table.move_to_end(domain)
+      self._evict(table)
+      self._table = table
+      self._changes = 0
+
+      try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, "w") as f:
+          json.dump(table, f)
+        os.replace(tmp_path, self.path)
+      except (IOError, OSError) as exc:
+        logger.error("Writing rule table {} failed".format(self.path))
+        logger.exception(exc)
+
+  def clear(self):
+    with self._lock:
+      self._table = collections.OrderedDict()
+      self._changes = 0
+
+rules = RuleTable(RULES_FILE or None)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Incremental parsing of a page's metadata, cf. Metadoc mode="meta".
+The page is fed to lxml chunk by chunk as it is downloaded, and reading stops
+as soon as <head> is complete and has all fields, or once the JSON-LD, <time>
+or itemprop nodes of the body have filled the missing ones. A byte cap bounds
+pages which never provide some fields.
+"""
+import lxml.etree
+
+from . import document
+from .html import HtmlMeta
+
+MAX_BYTES = 256 * 1024
+CHUNK_SIZE = 16 * 1024
+FIELDS = ("title", "authors", "published_date")
+
+class MetaStream(object):
+  '''Feed page bytes until ``feed`` returns True, then read ``meta``.
+  :param encoding: Charset declared by the server, sniffed from the first chunk if missing.
+  :param domain: Registered domain of the page, its learned rules are tried
+    first. A partial page is no evidence for them, so none are recorded.
+  :param max_bytes: Stop after this many bytes, complete or not.
+  '''
+
+  def __init__(self, encoding=None, domain=None, max_bytes=MAX_BYTES):
+    self.encoding = encoding
+    self.domain = domain
+    self.max_bytes = max_bytes
+    self.bytes_read = 0
+    self.done = False
+    self.complete = False
+    self.meta = None
+    self._parser = None
+    self._root = None
+    self._head_done = False
+
+  def _check(self):
+    meta = HtmlMeta(None, tree=self._root, domain=self.domain, learn=False)
+    meta.extract()
+    self.meta = meta
+    return all(getattr(meta, field) for field in FIELDS)
+
+  def _is_checkpoint(self, element):
+    if element.tag == "head":
+      self._head_done = True
+      return True
+    if not self._head_done:
+      return False
+    return (element.tag == "script" and element.get("type") == "application/ld+json") \
+      or (element.tag == "time" and element.get("itemprop") is not None) \
+      or (element.tag == "span" and element.get("itemprop") == "author")
+
+  def feed(self, chunk):
+    '''Parse the next chunk, return True once no more are needed.'''
+    if self.done:
+      return True
+    if self._parser is None:
+      encoding = document.sniff_encoding(chunk, self.encoding)
+      try:
+        self._parser = lxml.etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+      except LookupError:
+        self._parser = lxml.etree.HTMLPullParser(events=("start", "end"))
+
+    self.bytes_read += len(chunk)
+    self._parser.feed(chunk)
+    for event, element in self._parser.read_events():
+      if self._root is None:
+        self._root = element.getroottree().getroot()
+      if event == "end" and self._is_checkpoint(element) and self._check():
+        self.done = self.complete = True
+        break
+
+    if self.bytes_read >= self.max_bytes:
+      self.done = True
+    return self.done
+
+  def close(self):
+    '''Finish parsing whatever was read, return the HtmlMeta.'''
+    root = self._parser.close() if self._parser is not None else None
+    if root is not None: # None if nothing past the preamble was read
+      self._root = root
+    if self._root is None:
+      raise ValueError("Document is empty")
+    if not self.complete:
+      self._check()
+    return self.meta
+
+def stream_meta(chunks, encoding=None, domain=None, max_bytes=MAX_BYTES):
+  '''Run a MetaStream over an iterable of byte chunks, e.g. a streamed response.'''
+  stream = MetaStream(encoding=encoding, domain=domain, max_bytes=max_bytes)
+  for chunk in chunks:
+    if chunk and stream.feed(chunk):
+      break
+  return stream.close(), stream.bytes_read
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Registered domains of urls, from the public suffix list bundled with
+tldextract. One extractor per process, loaded through the model registry,
+and a memo of the split of each hostname seen, so looking up a domain costs
+a url split and a dict lookup.
+"""
+import functools
+import urllib.parse
+
+import tldextract
+
+from .registry import registry
+
+def _load_suffix_list():
+  extract = tldextract.TLDExtract(suffix_list_urls=None) # bundled snapshot, never fetched
+  extract("example.com") # reads the snapshot
+  return extract
+
+registry.register("suffix_list", _load_suffix_list)
+
+def hostname(url):
+  '''Lowercase host of a url, also of one without scheme like "bbc.co.uk/news".'''
+  url = url.strip()
+  host = urllib.parse.urlsplit(url if "//" in url else "//" + url).hostname
+  return host.rstrip(".") if host else None
+
+@functools.lru_cache(maxsize=65536)
+def split_host(host):
+  '''(subdomain, domain, suffix) of a hostname.'''
+  tld = registry.get("suffix_list")(host)
+  return tld.subdomain, tld.domain, tld.suffix
+
+def split(url):
+  host = hostname(url) if url else None
+  return split_host(host) if host else ("", "", "")
+
+def registered_domain(url):
+  '''Domain as registered with the registrar, e.g. "bbc.co.uk".'''
+  subdomain, domain, suffix = split(url)
+  return "{}.{}".format(domain, suffix) if domain and suffix else None
+
+def fqdn(url):
+  '''Full hostname, e.g. "www.bbc.co.uk", if it has a registered domain.'''
+  subdomain, domain, suffix = split(url)
+  if not (domain and suffix):
+    return None
+  return ".".join(part for part in (subdomain, domain, suffix) if part)
+
+def normalize_domains(urls):
+  '''Registered domains of many urls, e.g. for batch jobs, each distinct
+  hostname split once. None for urls without one.'''
+  hosts = [hostname(url) if url else None for url in urls]
+  domains = {host: registered_domain(host) for host in set(hosts) if host}
+  return [domains.get(host) for host in hosts]
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Article downloads. One pooled requests session for all articles, with
+connect/read timeouts, a cap on the body size and conditional GETs for pages
+whose extraction is cached: a 304 lets the extractor reuse its results.
+Fetcher.afetch does the same over an aiohttp session, cf. Metadoc.aquery.
+"""
+import asyncio
+import collections
+import logging
+import os
+import urllib.parse
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import get_encoding_from_headers
+
+from .cache import LRUCache, normalize_url
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = os.environ.get("USER_AGENT",
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/67.0.3396.87 Safari/537.36")
+
+CONNECT_TIMEOUT = float(os.environ.get("FETCH_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("FETCH_READ_TIMEOUT", 20))
+MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", 10 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+POOL_HOSTS = 50 # hosts with a pool of open connections
+POOL_SIZE = 10 # open connections per host
+
+HEADERS = {
+  'Accept-Encoding': 'identity, gzip, deflate, *',
+  'User-Agent': USER_AGENT
+}
+
+Page = collections.namedtuple("Page", "url content encoding etag last_modified not_modified cachekey")
+
+class FetchError(Exception):
+    pass
+
+class TooLarge(FetchError):
+    pass
+
+def article_url(url):
+    """Add the netloc to urls given without scheme, e.g. theintercept.com/2016/..."""
+    p = urllib.parse.urlparse(url)
+    netloc = p.netloc or p.path
+    path = p.path if p.netloc else ''
+    return urllib.parse.ParseResult(p.scheme, netloc, path, *p[3:]).geturl()
+
+class Fetcher(object):
+    """Download pages over a shared session.
+    :param timeout: (connect, read) timeouts in seconds.
+    :param max_bytes: Larger pages raise TooLarge, without being read.
+    :param validators: Cache for ETag and Last-Modified per url, cf. remember.
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_bytes=MAX_BYTES,
+            pool_hosts=POOL_HOSTS, pool_size=POOL_SIZE, validators=None):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.validators = validators if validators is not None else LRUCache(max_bytes=4 * 1024 * 1024)
+        self.not_modified = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(HEADERS)
+
+    def open(self, url, headers=None, seen=None):
+        """Streamed response of a page, to be closed by the caller."""
+        req = self.session.get(article_url(url), stream=True, timeout=self.timeout, headers=headers)
+        try:
+            self._check_status(req.status_code, seen)
+        except FetchError:
+            req.close()
+            raise
+        return req
+
+    def _conditional(self, url, conditional):
+        """Validators remembered for the url, and the headers sending them"""
+        seen = self.validators.get(normalize_url(url)) if conditional else None
+        headers = {}
+        if seen and seen["etag"]:
+            headers["If-None-Match"] = seen["etag"]
+        if seen and seen["last_modified"]:
+            headers["If-Modified-Since"] = seen["last_modified"]
+        return seen, headers
+
+    def _check_status(self, status, seen=None):
+        if status == 200 or (status == 304 and seen):
+            return
+        raise FetchError('Requesting article body failed with {} status code.'.format(status))
+
+    def _not_modified(self, url, seen):
+        self.not_modified += 1
+        return Page(url, None, None, seen["etag"], seen["last_modified"], True, seen["cachekey"])
+
+    def _page(self, url, headers, content):
+        # requests defaults to latin-1 for text/* without a charset,
+        # the extractor sniffs it instead.
+        declared = get_encoding_from_headers(headers) \
+            if "charset" in headers.get("content-type", "").lower() else None
+        return Page(url, content, declared, headers.get("etag"), headers.get("last-modified"), False, None)
+
+    def fetch(self, url, conditional=False):
+        """Download a page, return a Page. With conditional, a page
+        remembered before is only downloaded if it has changed since, else
+        content is None and not_modified set.
+        """
+        seen, headers = self._conditional(url, conditional)
+        req = self.open(url, headers=headers, seen=seen)
+        try:
+            if req.status_code == 304:
+                return self._not_modified(url, seen)
+            return self._page(url, req.headers, self.read(req))
+        finally:
+            req.close()
+
+    async def afetch(self, url, session, conditional=False):
+        """Like fetch, over an aiohttp ClientSession, e.g. the shared one
+        of metadoc.social.sessions, whose own timeouts are overridden."""
+        seen, headers = self._conditional(url, conditional)
+        headers.update(HEADERS)
+        timeout = aiohttp.ClientTimeout(total=sum(self.timeout), connect=self.timeout[0])
+
+        async def download():
+            async with session.get(article_url(url), headers=headers, timeout=timeout) as resp:
+                self._check_status(resp.status, seen)
+                if resp.status == 304:
+                    return self._not_modified(url, seen)
+                return self._page(url, resp.headers, await self.aread(resp))
+
+        return await asyncio.wait_for(download(), sum(self.timeout))
+
+    def read(self, req):
+        """Body of a streamed response, up to max_bytes."""
+        length = req.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            raise TooLarge("Article body of {} bytes exceeds {} bytes.".format(length, self.max_bytes))
+
+        content = bytearray()
+        for chunk in req.iter_content(CHUNK_SIZE):
+            content += chunk
+            if len(content) > self.max_bytes:
+                raise TooLarge("Article body exceeds {} bytes.".format(self.max_bytes))
+        return bytes(content)
+
+    async def aread(self, resp):
+        """Body of an aiohttp response, up to max_bytes."""
+        length = resp.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            raise TooLarge("Article body of {} bytes exceeds {} bytes.".format(length, self.max_bytes))
+
+        content = bytearray()
+        while True:
+            chunk = await resp.content.read(CHUNK_SIZE)
+            if not chunk:
+                return bytes(content)
+            content += chunk
+            if len(content) > self.max_bytes:
+                raise TooLarge("Article body exceeds {} bytes.".format(self.max_bytes))
+
+    def remember(self, page, cachekey):
+        """Send validators with the next fetch of the page, cachekey being
+        where its extraction results are cached."""
+        if page.etag or page.last_modified:
+            self.validators.set(normalize_url(page.url), {
+                "etag": page.etag,
+                "last_modified": page.last_modified,
+                "cachekey": cachekey,
+            })
+
+    def stats(self):
+        stats = self.validators.stats()
+        stats["not_modified"] = self.not_modified
+        return stats
+
+fetcher = Fetcher() # shared by all Metadoc instances, pools connections
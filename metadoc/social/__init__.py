@@ -1 +1,2 @@
-from .activity import ActivityCount
\ No newline at end of file
+from .activity import ActivityCount
+from .session import sessions
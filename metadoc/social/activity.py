@@ -7,11 +7,19 @@ import requests
 import signal
 import time
 
-from aiohttp import ClientSession
+from ..cache import normalize_url
+from ..coalesce import Coalescer
+from .breaker import CircuitBreaker
 from .providers import providers
+from .session import sessions
 
 logger = logging.getLogger(__name__)
 
+sharecounts = Coalescer() # one request per provider and article at a time
+breakers = {p["provider"]: CircuitBreaker(**{k: p[k] for k in ("failures", "cooldown") if k in p})
+    for p in providers}
+TIMEOUT = 2.0 # seconds, for providers without a "timeout"
+
 class ActivityCount(object):
     """Gather activity/share stats from social APIs"""
 
@@ -28,28 +36,56 @@ class ActivityCount(object):
 
         return asyncio.gather(*activity_tasks)
 
+    async def collect(self):
+        """Coroutine of get_all, e.g. for sessions.run"""
+        await self.get_all(asyncio.get_event_loop())
+
     async def get_json(self, url):
-        async with ClientSession() as session:
-            async with session.get(url) as response:
-                return await response.read()
+        async with sessions.get().get(url) as response:
+            return await response.read()
 
-    async def collect_sharecount(self, url, provider):
+    async def get_sharecount(self, url, provider):
+        breaker = breakers[provider["provider"]]
         try:
-            response = await self.get_json(url)
+            response = await asyncio.wait_for(self.get_json(url), provider.get("timeout", TIMEOUT))
             j = json.loads(response)
+        except Exception:
+            breaker.failure()
+            raise
+        breaker.success()
+
+        data = {
+            "provider": provider["provider"],
+            "status": "ok",
+            "metrics": []
+        }
+
+        for m in provider["metrics"]:
+            data["metrics"].append({
+            "count": jmespath.search(m["path"], j),
+            "label": m["label"]
+            })
+        return data
 
-            data = {
-                "provider": provider["provider"],
-                "metrics": []
-            }
-
-            for m in provider["metrics"]:
-                data["metrics"].append({
-                "count": jmespath.search(m["path"], j),
-                "label": m["label"]
-                })
-            self.responses.append(data)
+    async def collect_sharecount(self, url, provider):
+        try:
+            self.responses.append(await self.guarded_sharecount(url, provider))
         except Exception as exc:
             logger.error("Collecting sharecount failed!")
             logger.exception(exc)
 
+    async def guarded_sharecount(self, url, provider):
+        """Share counts, or the reason there are none"""
+        name = provider["provider"]
+        if not breakers[name].allow():
+            return {"provider": name, "status": "skipped", "metrics": []}
+        try:
+            key = (name, normalize_url(self.url))
+            return await sharecounts.ado(key, self.get_sharecount, url, provider)
+        except asyncio.TimeoutError:
+            logger.warning("Collecting sharecount from {} timed out".format(name))
+            return {"provider": name, "status": "timeout", "metrics": []}
+        except Exception as exc:
+            logger.error("Collecting sharecount from {} failed!".format(name))
+            logger.exception(exc)
+            return {"provider": name, "status": "error", "metrics": []}
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Circuit breakers for the social providers. After a number of failures
+or timeouts in a row a provider is not called for a cool-down period, then
+a single trial call decides whether it is called again.
+"""
+import threading
+import time
+
+FAILURES = 5 # in a row, before the breaker opens
+COOLDOWN = 60 # seconds without calls once open
+
+class CircuitBreaker(object):
+
+    def __init__(self, failures=FAILURES, cooldown=COOLDOWN):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.skipped = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return "closed"
+        if time.time() - self.opened < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """Whether to call the provider now"""
+        with self._lock:
+            state = self.state
+            if state == "closed" or (state == "half-open" and not self._trial):
+                self._trial = state == "half-open"
+                return True
+            self.skipped += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.max_failures:
+                self.opened = time.time()
+            self._trial = False
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "skipped": self.skipped}
@@ -2,11 +2,16 @@
 there's a lot of interesting metadata in e.g. reddit responses like
 user_reports, report_reasons, num_reports, that might be useful
 in building certain heuristics.
+
+Each provider has a latency budget in seconds, "timeout", after which it is
+reported as timed out, and optionally "failures" and "cooldown" for its
+circuit breaker, cf. breaker.py.
 """
 
 providers = [
   {
     "provider": "facebook",
+    "timeout": 2.0,
     "endpoint": "https://graph.facebook.com/?id={0}",
     "metrics": [{
       "label": "sharecount",
@@ -15,6 +20,7 @@ providers = [
   },
   {
     "provider": "linkedin",
+    "timeout": 2.0,
     "endpoint": "https://www.linkedin.com/countserv/count/share?url={0}/&format=json",
     "metrics": [{
       "label": "sharecount",
@@ -23,6 +29,7 @@ providers = [
   },
   {
     "provider": "reddit",
+    "timeout": 2.0,
     "endpoint": "https://buttons.reddit.com/button_info.json?url={0}",
     "metrics": [{
       "label": "upvotes",
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""aiohttp sessions for the social providers and article downloads. A
+session is bound to its event loop, so there is one per loop, kept for the
+lifetime of the loop: owners of a loop await close before closing it. Sync
+callers run their lookups on a shared loop in a background thread, cf. run,
+which keeps connections to the providers alive across queries.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+LIMIT = int(os.environ.get("SOCIAL_CONNECTIONS", 100)) # open connections in total
+LIMIT_PER_HOST = int(os.environ.get("SOCIAL_CONNECTIONS_PER_PROVIDER", 20))
+DNS_TTL = 300 # seconds to cache provider addresses
+TOTAL_TIMEOUT = float(os.environ.get("SOCIAL_TIMEOUT", 10))
+CONNECT_TIMEOUT = 3
+
+class SessionManager(object):
+    """One ClientSession per event loop, with bounded connections per
+    provider host, a DNS cache and timeouts."""
+
+    def __init__(self, limit=LIMIT, limit_per_host=LIMIT_PER_HOST, dns_ttl=DNS_TTL,
+            total_timeout=TOTAL_TIMEOUT, connect_timeout=CONNECT_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def get(self):
+        """Session of the running loop, created on first use"""
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is not None and not session.closed:
+                return session
+            for other in [l for l in self._sessions if l.is_closed()]:
+                self._release(self._sessions.pop(other), loop)
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                limit_per_host=self.limit_per_host, ttl_dns_cache=self.dns_ttl)
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[loop] = session
+            return session
+
+    def _release(self, session, loop):
+        """Close a session whose loop was closed without close"""
+        if session.closed:
+            return
+        logger.warning("Closing the session of a closed event loop, await close before closing loops")
+        loop.create_task(session.close())
+
+    async def close(self):
+        """Close the session of the running loop, e.g. before closing it"""
+        with self._lock:
+            session = self._sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def _background(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                    name="metadoc-social", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the shared background loop, wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._background()).result(timeout)
+
+    def shutdown(self):
+        """Close the session of the background loop, and the loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.close(), loop).result(5)
+        except Exception as exc:
+            logger.exception(exc)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+        loop.close()
+
+sessions = SessionManager()
+atexit.register(sessions.shutdown)
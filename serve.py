@@ -8,12 +8,29 @@ __license__ = 'MIT'
 
 import concurrent
 import json
+import os
 import bottle
 from bottle import response, request, get, route, run, abort, error
 from metadoc import Metadoc
+from metadoc.cache import LRUCache, SQLiteCache, ResponseCache
+from metadoc.extract.registry import registry, warmup
+from metadoc.fetch import fetcher
+from metadoc.domain.domaintools import lookups
+from metadoc.domain.lookup import whois_cache
+from metadoc.social.activity import sharecounts, breakers
 
 bottle.BaseRequest.MEMFILE_MAX = 1024 * 1024 # up max POST payload size to 1MB
 
+# process-wide caches, shared by all requests
+caches = {
+  "sentence_cache": LRUCache(max_bytes=32 * 1024 * 1024), # boilerplate sentences
+  # extraction results per page, in a file if workers should share them
+  "extract_cache": SQLiteCache(os.environ["EXTRACT_CACHE_PATH"]) \
+    if os.environ.get("EXTRACT_CACHE_PATH") else LRUCache(max_bytes=64 * 1024 * 1024),
+}
+# full responses by url, each section with its own ttl
+response_cache = ResponseCache(LRUCache(max_bytes=64 * 1024 * 1024))
+
 @error(404)
 def error404(error):
   return json.dumps({'code': 404,'message': 'url param is missing.'})
@@ -39,7 +56,7 @@ def extract_article():
   if not url:
     abort(404)
 
-  metadoc = Metadoc(url=url)
+  metadoc = Metadoc(url=url, **caches)
   metadoc._prepare()
   metadoc._query_domain()
   metadoc._query_extract()
@@ -47,6 +64,32 @@ def extract_article():
   payload = metadoc._render() # Preserve order
   return json.dumps(payload)
 
+@get('/meta')
+def meta_article():
+  """GET data url required, reads the page only as far as its metadata"""
+  response.content_type = 'application/json'
+  url = request.query.getone("url")
+  if not url:
+    abort(404)
+
+  metadoc = Metadoc(url=url)
+  payload = metadoc.query(mode="meta")
+
+  return json.dumps(payload)
+
+@get('/stats')
+def stats():
+  """Cache hit rates and model load times"""
+  response.content_type = 'application/json'
+  payload = {name: cache.stats() for name, cache in caches.items()}
+  payload["response_cache"] = response_cache.stats()
+  payload["fetcher"] = fetcher.stats()
+  payload["whois_cache"] = whois_cache().stats()
+  payload["coalesced"] = {"social": sharecounts.stats(), "domain": lookups.stats()}
+  payload["providers"] = {name: breaker.stats() for name, breaker in breakers.items()}
+  payload["models"] = registry.stats()
+  return json.dumps(payload)
+
 @get('/full')
 def full_article():
   """GET data url required"""
@@ -55,10 +98,11 @@ def full_article():
   if not url:
     abort(404)
 
-  metadoc = Metadoc(url=url)
+  metadoc = Metadoc(url=url, response_cache=response_cache, **caches)
   payload = metadoc.query()
 
   return json.dumps(payload)
 
 
+warmup() # load nlp models once, before serving the first request
 run(host='localhost', reloader=True, port=6060)
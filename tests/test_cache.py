@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+import threading
+import unittest
+from unittest import mock
+
+from metadoc.cache import LRUCache, SQLiteCache, ResponseCache, normalize_url
+
+class MetadocLRUCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = LRUCache(max_bytes=200)
+
+  def test_get_set(self):
+    assert self.cache.get("foo") is None
+    self.cache.set("foo", ["Donald Trump"])
+    assert self.cache.get("foo") == ["Donald Trump"]
+    assert self.cache.get("bar", []) == []
+
+    stats = self.cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+
+  def test_copies_values(self):
+    value = ["Donald Trump"]
+    self.cache.set("foo", value)
+    self.cache.get("foo").append("Facebook")
+    assert self.cache.get("foo") == value
+
+  def test_size_cap(self):
+    for i in range(20):
+      self.cache.set("key{}".format(i), "x" * 20)
+      self.cache.get("key0") # keep it recent
+
+    assert self.cache.size <= 200
+    assert self.cache.get("key0") is not None
+    assert self.cache.get("key1") is None
+    assert self.cache.get("key19") is not None
+
+    self.cache.set("big", "x" * 500)
+    assert self.cache.get("big") is None
+
+class MetadocSQLiteCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp_dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+    self.cache = SQLiteCache(self.path, max_bytes=1000, evict_every=1)
+
+  def tearDown(self):
+    self.tmp_dir.cleanup()
+
+  def test_get_set(self):
+    assert self.cache.get("foo") is None
+    self.cache.set("foo", {"names": ["Donald Trump"]})
+    assert self.cache.get("foo") == {"names": ["Donald Trump"]}
+    # shared with another instance, e.g. in another worker
+    assert SQLiteCache(self.path).get("foo") == {"names": ["Donald Trump"]}
+    assert self.cache.stats()["hits"] == 1
+
+  def test_size_cap(self):
+    for i in range(50):
+      self.cache.set("key{}".format(i), "x" * 100)
+    assert self.cache.stats()["bytes"] <= 1000
+    assert self.cache.get("key0") is None
+    assert self.cache.get("key49") is not None
+
+class MetadocResponseCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = ResponseCache(ttls={"social": 10})
+    self.url = "https://www.theguardian.com/world/2016/jun/23/eu-referendum"
+
+  def test_normalize_url(self):
+    assert normalize_url("HTTPS://www.Theguardian.com:443/world/?utm_source=tw&b=2&a=1#comments") \
+      == "https://www.theguardian.com/world?a=1&b=2"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+  def test_ttl(self):
+    assert self.cache.get(self.url, "social") is None
+    self.cache.set(self.url, "social", [{"provider": "facebook"}])
+    assert self.cache.get(self.url + "?utm_medium=email", "social") == ([{"provider": "facebook"}], True)
+    assert self.cache.get(self.url, "domain") is None
+
+    with mock.patch("metadoc.cache.time.time", return_value=time.time() + 15):
+      assert self.cache.get(self.url, "social") == ([{"provider": "facebook"}], False)
+      assert self.cache.get(self.url, "extract") is None # different ttl, but never set
+    with mock.patch("metadoc.cache.time.time", return_value=time.time() + 25):
+      assert self.cache.get(self.url, "social") is None
+    assert self.cache.stats()["stale_hits"] == 1
+
+  def test_refresh(self):
+    release = threading.Event()
+    def compute(sections):
+      release.wait(5)
+      return {section: "fresh" for section in sections}
+
+    future = self.cache.refresh(self.url, ["social", "domain"], compute)
+    assert self.cache.refresh(self.url, ["social"], compute) is None # already running
+    release.set()
+    future.result(5)
+    assert self.cache.get(self.url, "domain") == ("fresh", True)
+    assert self.cache.stats()["refreshes"] == 1
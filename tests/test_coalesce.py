@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import asynctest
+import threading
+import concurrent.futures
+
+from metadoc.coalesce import Coalescer
+
+class MetadocCoalescerTest(asynctest.TestCase):
+  @asynctest.ignore_loop
+  def test_do(self):
+    coalescer = Coalescer()
+    release = threading.Event()
+    def lookup():
+      release.wait(5)
+      return {"credibility": {"is_blacklisted": False}}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+      futures = [executor.submit(coalescer.do, "theintercept.com", lookup) for i in range(4)]
+      while coalescer.stats()["saved"] < 3:
+        pass
+      release.set()
+      results = [f.result(5) for f in futures]
+
+    assert all(r == {"credibility": {"is_blacklisted": False}} for r in results)
+    assert coalescer.stats() == {"calls": 1, "saved": 3, "in_flight": 0}
+
+  async def test_ado(self):
+    coalescer = Coalescer()
+    calls = []
+    async def sharecount(provider):
+      calls.append(provider)
+      await asyncio.sleep(0.01)
+      return {"provider": provider}
+
+    results = await asyncio.gather(*[coalescer.ado("facebook", sharecount, "facebook") for i in range(3)])
+    assert results == [{"provider": "facebook"}] * 3
+    assert calls == ["facebook"]
+    assert coalescer.stats()["saved"] == 2
+
+  async def test_ado_fail(self):
+    coalescer = Coalescer()
+    async def sharecount():
+      await asyncio.sleep(0.01)
+      raise ValueError("rate limited")
+
+    results = await asyncio.gather(*[coalescer.ado("facebook", sharecount) for i in range(2)],
+      return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert await coalescer.ado("reddit", asyncio.sleep, 0, "next") == "next"
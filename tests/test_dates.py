@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import datetime
+
+from dateutil.parser import parse
+from dateutil.tz import tzoffset
+
+from metadoc.extract import dates
+
+class MetadocDatesTest(unittest.TestCase):
+  def dateutil(self, value):
+    return parse(value).astimezone().astimezone(tzoffset(None, 0)).replace(microsecond=0).isoformat()
+
+  def test_same_as_dateutil(self):
+    values = [
+      "2018-02-16T00:01:52+00:00", "2018-02-16T10:59:47.123Z", "2018-02-16 10:59:47+0100",
+      "2018-02-16T10:59-05:00", "2018-02-16T10:59:47+05", "2018-02-16", "2018-02-16T10:59:47",
+      "Fri, 16 Feb 2018 10:59:47 GMT", "16 Feb 2018 10:59 -0500", "February 16, 2018 10:59 AM",
+    ]
+    for value in values:
+      assert dates.normalize_date(value) == self.dateutil(value), value
+
+  def test_fallback(self):
+    assert dates._parse_fast("2017-06-07T02:19-500") is None
+    assert dates._parse_fast("February 16, 2018") is None
+    with self.assertRaises(ValueError):
+      dates.normalize_date("18-2-15 54")
+    with self.assertRaises(ValueError):
+      dates.normalize_date("2018-02-30")
+
+  def test_datetime(self):
+    now = datetime.now()
+    assert dates.normalize_date(now) == dates.to_utc_iso(now)
+    assert dates.utc_now_iso().endswith("+00:00")
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from metadoc.extract import document
+from metadoc.extract.html import HtmlMeta
+
+class MetadocDocumentTest(unittest.TestCase):
+  def setUp(self):
+    self.page = '<html><head><meta charset="iso-8859-1"><title>Grüße</title></head><body><p>Für 😀 alle</p></body></html>'
+
+  def test_sniff_encoding(self):
+    latin = self.page.encode("latin-1", "ignore")
+    assert document.sniff_encoding(latin) == "iso8859-1"
+    assert document.sniff_encoding(latin, "windows-1252") == "cp1252"
+    # UTF-8 page labeled as latin-1, cf. t3n.de
+    assert document.sniff_encoding(self.page.encode("utf-8"), "ISO-8859-1") == "utf-8"
+    assert document.sniff_encoding("<p>Grüße</p>".encode("utf-8")) == "utf-8"
+    assert document.sniff_encoding(b'<meta charset=""><p>ascii</p>') is None
+
+  def test_strip_emoji(self):
+    content = "Für 😀 alle 🇩🇪".encode("utf-8")
+    assert document.strip_emoji(content) == "Für  alle ".encode("utf-8")
+    ascii = b"<p>no emoji</p>"
+    assert document.strip_emoji(ascii) is ascii
+
+  def test_parse_bytes(self):
+    content, encoding = document.to_bytes(self.page.encode("utf-8"), "iso-8859-1")
+    tree = document.parse(document.strip_emoji(content), encoding)
+    assert tree.xpath("string(//p)") == "Für  alle"
+
+    meta = HtmlMeta(self.page.encode("latin-1", "ignore"))
+    assert meta.extract_title() == "Grüße"
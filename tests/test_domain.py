@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import concurrent.futures
 import os
 import datetime
+import tempfile
+import time
 
 import unittest
 from unittest.mock import patch
+from metadoc.cache import LRUCache, SQLiteCache, TieredCache
 from metadoc.domain import Domaintools
+from metadoc.domain import check, lookup, store
 
 class MetadocDomaintoolsTest(unittest.TestCase):
 
@@ -48,3 +54,155 @@ class MetadocDomaintoolsTest(unittest.TestCase):
 
     assert self.domaintools.credibility["fake_confidence"] == 0.2
 
+
+class MetadocWhoisCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp_dir.name, "whois.sqlite")
+    self.cache = TieredCache(LRUCache(), SQLiteCache(self.path))
+    self.date_registered = datetime.datetime(2008, 10, 1, 0, 0)
+
+  def tearDown(self):
+    self.tmp_dir.cleanup()
+
+  @patch('metadoc.domain.lookup.query_whois')
+  def test_cached(self, query_whois):
+    query_whois.return_value = self.date_registered
+    assert lookup.whois_date_registered("theintercept.com", self.cache) == self.date_registered
+    assert lookup.whois_date_registered("theintercept.com", self.cache) == self.date_registered
+    # another worker
+    disk_only = TieredCache(LRUCache(), SQLiteCache(self.path))
+    assert lookup.whois_date_registered("theintercept.com", disk_only) == self.date_registered
+    assert query_whois.call_count == 1
+
+    with patch('metadoc.domain.lookup.time.time', return_value=time.time() + lookup.TTL + 1):
+      lookup.whois_date_registered("theintercept.com", self.cache)
+    assert query_whois.call_count == 2
+
+  @patch('metadoc.domain.lookup.query_whois')
+  def test_failure(self, query_whois):
+    query_whois.return_value = None
+    assert lookup.whois_date_registered("nourlatall.com", self.cache) is None
+    assert lookup.whois_date_registered("nourlatall.com", self.cache) is None
+    assert query_whois.call_count == 1
+
+    with patch('metadoc.domain.lookup.time.time', return_value=time.time() + lookup.FAILURE_TTL + 1):
+      lookup.whois_date_registered("nourlatall.com", self.cache)
+    assert query_whois.call_count == 2
+
+  @patch('metadoc.domain.lookup.query_whois')
+  def test_prewarm(self, query_whois):
+    query_whois.return_value = self.date_registered
+    assert lookup.prewarm(["theintercept.com", "nytimes.com", "nytimes.com"], cache=self.cache) == 2
+    assert lookup.prewarm(["theintercept.com", "wired.com"], cache=self.cache) == 1
+    assert query_whois.call_count == 3
+
+  def whois_binary(self, script):
+    path = os.path.join(self.tmp_dir.name, "whois")
+    with open(path, "w") as f:
+      f.write("#!/bin/sh\n" + script)
+    os.chmod(path, 0o755)
+    return patch('metadoc.domain.lookup.WHOIS_BINARY', path)
+
+  def test_query_whois(self):
+    output = "Domain Name: THEINTERCEPT.COM\n   Creation Date: 2008-10-01T00:00:00Z\n"
+    with self.whois_binary("printf '{}'".format(output)):
+      assert lookup.whois_date_registered("theintercept.com", self.cache) == self.date_registered
+    assert lookup.parse_creation_date("created: 1996-08-01\n") == datetime.datetime(1996, 8, 1)
+
+    # from the event loops of worker threads, as in Metadoc.query
+    with self.whois_binary("printf '{}'".format(output)), concurrent.futures.ThreadPoolExecutor(4) as pool:
+      dates = list(pool.map(lambda d: lookup.whois_date_registered(d, LRUCache()), ["a.com", "b.com", "c.com"]))
+    assert dates == [self.date_registered] * 3
+    assert lookup.parse_creation_date("No match for domain") is None
+
+  def test_query_whois_timeout(self):
+    start_time = time.time()
+    with self.whois_binary("sleep 5"), patch('metadoc.domain.lookup.TIMEOUT', 0.2):
+      assert lookup.whois_date_registered("theintercept.com", self.cache) == lookup.UNKNOWN
+      assert lookup.cached_date_registered("theintercept.com", self.cache) == (True, lookup.UNKNOWN)
+    assert time.time() - start_time < 2
+
+    # waiting for a free thread counts too
+    async def both():
+      return await asyncio.gather(lookup.query_whois("a.com", 0.3), lookup.query_whois("b.com", 0.3))
+    start_time = time.time()
+    loop = asyncio.new_event_loop()
+    with self.whois_binary("sleep 5"), \
+        patch('metadoc.domain.lookup._executor', concurrent.futures.ThreadPoolExecutor(1)):
+      assert loop.run_until_complete(both()) == [lookup.UNKNOWN, lookup.UNKNOWN]
+    loop.close()
+    assert time.time() - start_time < 2
+
+    domaintools = Domaintools(url="https://theintercept.com/")
+    with patch('metadoc.domain.domaintools.whois_date_registered', return_value=lookup.UNKNOWN):
+      domaintools.get_all()
+    assert domaintools.date_registered is None
+    assert domaintools.date_registered_iso == lookup.UNKNOWN
+
+class MetadocBlacklistIndexTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = check.BlacklistIndex({
+      "propornot": ["infowars.com", "70news.wordpress.com", "zerohedge.com"],
+      "opensources": ["infowars.com", "Naturalnews.com"],
+    })
+
+  def test_lookup(self):
+    assert self.index.lookup("infowars.com") == {"propornot", "opensources"}
+    assert self.index.lookup("www.infowars.com") == {"propornot", "opensources"}
+    assert self.index.lookup("naturalnews.com") == {"opensources"}
+    assert self.index.lookup("70news.wordpress.com") == {"propornot"}
+    assert self.index.lookup("wordpress.com") == frozenset()
+    assert self.index.lookup("theintercept.com") == frozenset()
+    assert self.index.lookup_many(["zerohedge.com", "com"]) == {"zerohedge.com": {"propornot"}, "com": frozenset()}
+
+  def test_below(self):
+    assert self.index.below("wordpress.com") == ["70news.wordpress.com"]
+    assert self.index.below("com") == ["70news.wordpress.com", "infowars.com", "naturalnews.com", "zerohedge.com"]
+    assert self.index.below("example.org") == []
+
+  def test_check_credibility(self):
+    assert check.check_credibility("theintercept.com") == {"is_blacklisted": False, "fake_confidence": "0.00"}
+    assert check.check_credibility("70news.wordpress.com")["is_blacklisted"]
+    assert Domaintools(url="https://70news.wordpress.com/2016/11/12/").hostname == "70news.wordpress.com"
+
+class MetadocBlacklistStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp_dir.name, "blacklists.bin")
+    self.feeds = {
+      "propornot": ["infowars.com", "70news.wordpress.com", "zerohedge.com"],
+      "opensources": ["infowars.com", "Naturalnews.com"],
+    }
+    store.build(self.path, self.feeds)
+    self.store = store.BlacklistStore(self.path, check_every=0)
+
+  def tearDown(self):
+    self.tmp_dir.cleanup()
+
+  def test_same_as_index(self):
+    index = check.BlacklistIndex(self.feeds)
+    hosts = ["infowars.com", "www.infowars.com", "naturalnews.com", "70news.wordpress.com",
+      "wordpress.com", "theintercept.com", "com"]
+    assert self.store.lookup_many(hosts) == index.lookup_many(hosts)
+    assert self.store.sources == index.sources
+
+  def test_reload(self):
+    assert self.store.lookup("theintercept.com") == frozenset()
+    store.build(self.path, {"propornot": ["theintercept.com"]})
+    assert self.store.lookup("theintercept.com") == {"propornot"}
+    assert self.store.reloads == 1
+    assert not self.store.reload() # unchanged
+
+  def test_read_feed(self):
+    csv_path = os.path.join(self.tmp_dir.name, "sources.csv")
+    with open(csv_path, "w") as f:
+      f.write("type,domain\nfake,infowars.com\nsatire,theonion.com\n")
+    txt_path = os.path.join(self.tmp_dir.name, "propornot.txt")
+    with open(txt_path, "w") as f:
+      f.write("# PropOrNot\ninfowars.com\n\nzerohedge.com\n")
+    assert store.read_feed(csv_path) == ["infowars.com", "theonion.com"]
+    assert store.read_feed(txt_path) == ["infowars.com", "zerohedge.com"]
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import unittest
 from unittest.mock import patch
+from metadoc.cache import LRUCache
 from metadoc.extract import Extractor
+from metadoc.extract.language import detect_language
+from metadoc.extract.ner import EntityExtractor
 from metadoc.extract.pos import do_train
+from metadoc.extract.registry import registry
 
 class MetadocExtractorTest(unittest.TestCase):
   def setUp(self):
@@ -20,8 +24,78 @@ class MetadocExtractorTest(unittest.TestCase):
     self.extractor.detect_language()
     assert self.extractor
 
+  def test_detect_language(self):
+    text = "Die Bundesregierung hat am Mittwoch einen Entwurf beschlossen, der die Rente stabilisieren soll. " * 40
+    results = [detect_language(text) for i in range(5)]
+    assert len(set(results)) == 1
+    assert results[0][0] == "de" and results[0][1] > 0.9
+    assert detect_language("   ") == (None, 0.0)
+
+  def test_skip_entities_non_english(self):
+    self.extractor.fulltext = "Die Bundesregierung hat am Mittwoch einen Entwurf beschlossen."
+    self.extractor.detect_language()
+    self.extractor.extract_entities()
+    assert self.extractor.language == "de"
+    assert self.extractor.language_confidence > 0.9
+    assert self.extractor.names == [] and self.extractor.keywords == []
+
+  def test_entities_short_english(self):
+    for text in ("Apple iCloud Cellebrite Skype FBI",
+        "Laura Ingraham LifeZette Trump administration", "Kim Zetter reports."):
+      extractor = Extractor(text)
+      extractor.fulltext = text
+      extractor.detect_language()
+      assert extractor.language != "en" and extractor.language_confidence < 0.95
+      assert extractor.is_english()
+
+    extractor.language, extractor.language_confidence = "de", None # declared, unchecked
+    assert extractor.is_english()
+
+  def test_declared_language_checked(self):
+    path = "tests/fixtures/businessinsider.com/dropbox-vp-todd-jackson-leaves-for-first-round-capital-2018-4.html"
+    with open(path, "r") as article:
+      extractor = Extractor(article.read())
+    extractor.get_all() # English text, <html lang="de">
+    assert extractor.language == "en" and extractor.language_confidence >= 0.95
+    assert "Todd Jackson" in extractor.names
+
+    german = Extractor("")
+    german.language = "de"
+    german.fulltext = "Die Bundesregierung hat am Mittwoch einen Entwurf beschlossen, der die Rente stabilisieren soll. " * 5
+    german.detect_language()
+    assert german.language == "de" and not german.is_english()
+
   def test_get_all_local(self):
     do_train()
     self.extractor.get_all()
     assert self.extractor.contenthash == "2b374ca41d42bd582e500e6cdbc936ef"
     assert self.extractor.title == "Some Fake News Publishers Just Happen to Be Donald Trump’s Cronies"
+
+  def test_sentence_cache(self):
+    text = "Donald Trump met Angela Merkel in Berlin. Read more on Facebook."
+    cache = LRUCache()
+    first = EntityExtractor(text, cache=cache).get_scored_entities()
+    assert cache.stats()["misses"] == 2
+
+    second = EntityExtractor(text, cache=cache).get_scored_entities()
+    assert cache.stats()["hits"] == 2
+    assert first == second
+
+  def test_extract_cache(self):
+    cache = LRUCache()
+    first = Extractor(self.article_html, extract_cache=cache)
+    first.get_all()
+    assert cache.stats()["misses"] == 1
+
+    registry.clear()
+    second = Extractor(self.article_html, extract_cache=cache)
+    second.get_all()
+    assert cache.stats()["hits"] == 1
+    assert not any(model["loaded"] for model in registry.stats().values())
+    for field in Extractor.RESULT_FIELDS:
+      assert getattr(second, field) == getattr(first, field)
+    assert second.scraped_date
+
+    changed = Extractor(self.article_html.replace("Trump", "Trumpf"), extract_cache=cache)
+    changed.get_all()
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+
+from metadoc import Metadoc
+from metadoc.cache import LRUCache
+from metadoc.fetch import Fetcher, FetchError, TooLarge
+
+def response(status_code=200, content=b"", headers=None):
+  req = mock.MagicMock(status_code=status_code, headers=headers or {}, encoding=None)
+  req.iter_content.return_value = iter([content[i:i + 1000] for i in range(0, len(content), 1000)])
+  return req
+
+class MetadocFetcherTest(unittest.TestCase):
+  def setUp(self):
+    self.url = "https://theintercept.com/2016/11/26/laura-ingraham-lifezette/"
+    with open("tests/fixtures/theintercept.com/laura-ingraham-lifezette.html", "rb") as f:
+      self.content = f.read()
+    self.fetcher = Fetcher(max_bytes=len(self.content))
+
+  def test_fetch(self):
+    headers = {"content-type": "text/html; charset=utf-8", "etag": '"abc"'}
+    with mock.patch.object(self.fetcher.session, "get", return_value=response(content=self.content, headers=headers)) as get:
+      page = self.fetcher.fetch(self.url)
+    assert page.content == self.content
+    assert page.etag == '"abc"'
+    assert get.call_args[1]["timeout"] == self.fetcher.timeout
+    assert get.call_args[1]["stream"] == True
+
+  def test_size_cap(self):
+    with mock.patch.object(self.fetcher.session, "get", return_value=response(content=self.content + b" ")):
+      with self.assertRaises(TooLarge):
+        self.fetcher.fetch(self.url)
+    req = response(headers={"content-length": str(len(self.content) + 1)})
+    with mock.patch.object(self.fetcher.session, "get", return_value=req):
+      with self.assertRaises(TooLarge):
+        self.fetcher.fetch(self.url)
+    req.iter_content.assert_not_called()
+
+  def test_status(self):
+    with mock.patch.object(self.fetcher.session, "get", return_value=response(404)):
+      with self.assertRaises(FetchError):
+        self.fetcher.fetch(self.url)
+
+  def test_not_modified(self):
+    extract_cache = LRUCache()
+    headers = {"etag": '"abc"', "last-modified": "Sat, 26 Nov 2016 14:51:40 GMT"}
+    with mock.patch.object(self.fetcher.session, "get", return_value=response(content=self.content, headers=headers)):
+      first = Metadoc(url=self.url, fetcher=self.fetcher, extract_cache=extract_cache).query("extract")
+
+    with mock.patch.object(self.fetcher.session, "get", return_value=response(304)) as get:
+      with mock.patch("metadoc.Extractor.parse_html") as parse_html:
+        second = Metadoc(url=self.url, fetcher=self.fetcher, extract_cache=extract_cache).query("extract")
+    assert get.call_args[1]["headers"]["If-None-Match"] == '"abc"'
+    assert get.call_args[1]["headers"]["If-Modified-Since"] == headers["last-modified"]
+    parse_html.assert_not_called()
+    assert second["text"] == first["text"]
+    assert self.fetcher.stats()["not_modified"] == 1
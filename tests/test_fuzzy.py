@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import difflib
+import random
+import unittest
+
+from metadoc.extract.fuzzy import FuzzyMatcher
+
+class MetadocFuzzyMatcherTest(unittest.TestCase):
+  def setUp(self):
+    self.words = [
+      "donald trump", "donald j. trump", "trump", "trumps", "facebook",
+      "face book", "fbi", "f.b.i.", "hillary clinton", "clinton", "bill clinton",
+      "kim zetter", "apple", "apples", "icloud", "cellebrite", "skype", "a"
+    ]
+    self.matcher = FuzzyMatcher(self.words)
+
+  def test_same_as_difflib(self):
+    for word in self.words:
+      matches = difflib.get_close_matches(word, set(self.words), 2)
+      expected = matches[1] if len(matches) > 1 else None
+      assert self.matcher.best_match(word) == expected
+
+  def test_no_match(self):
+    assert self.matcher.best_match("zzzzzzzz") is None
+    assert self.matcher.best_match("") is None
+    assert FuzzyMatcher([]).best_match("trump") is None
+
+  def test_random_same_as_difflib(self):
+    rng = random.Random(0)
+    words = ["".join(rng.choice("abcde ") for _ in range(rng.randint(1, 12))) for _ in range(300)]
+    matcher = FuzzyMatcher(words)
+    for word in words[:100]:
+      matches = difflib.get_close_matches(word, set(words), 2)
+      expected = matches[1] if len(matches) > 1 else None
+      assert matcher.best_match(word) == expected
+
+  def test_prefix_keeps_matches(self):
+    for word in self.words:
+      lo, hi = self.matcher._window(len(word))
+      rows = set(self.matcher._prefix(word, lo, hi))
+      for row in range(lo, hi):
+        ratio = difflib.SequenceMatcher(None, self.matcher.words[row], word).ratio()
+        if ratio >= self.matcher.cutoff:
+          assert row in rows
+      assert len(rows) < hi - lo
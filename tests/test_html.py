@@ -6,6 +6,7 @@ import asynctest
 
 from asynctest.mock import patch
 from metadoc.extract.html import HtmlMeta
+from metadoc.extract.stream import stream_meta
 
 def get_html_meta(article_path):
     with open(article_path, 'r') as article:
@@ -109,3 +110,41 @@ class MetadocHtmMetaTest(asynctest.TestCase):
             print(x, obj.image)"""
 
 
+
+    @asynctest.ignore_loop
+    def test_single_pass(self):
+        html = """<html><head><title>First</title><title>Second</title>
+            <meta property="og:title" content="">
+            <meta name="date" content="2018-02-16T00:01:52Z">
+            <meta name="date" content="2019-01-01T00:00:00Z">
+            <link rel="canonical" href="https://example.com/a">
+            </head><body><meta name="author" content="Body Author">
+            <time itemprop="datePublished" datetime="2017-01-01T00:00:00Z"></time>
+            </body></html>"""
+        meta = HtmlMeta(html)
+        assert meta.title == "First" # empty og:title falls through
+        assert meta.published_date == "2018-02-16T00:01:52+00:00"
+        assert meta.canonical_url == "https://example.com/a"
+        assert meta.authors == ["Body Author"]
+        assert meta.metatags["og:title"] == ""
+        assert meta.dates[("time", "itemprop", "datePublished")] == "2017-01-01T00:00:00Z"
+
+        meta.dates = {}
+        assert meta.published_date == "2018-02-16T00:01:52+00:00" # memoized
+
+        head_only = HtmlMeta(html, head_only=True)
+        head_only.extract()
+        assert head_only.authors == []
+        assert ("time", "itemprop", "datePublished") in head_only.dates
+
+    @asynctest.ignore_loop
+    def test_stream_preamble_only(self):
+        page = b"<!DOCTYPE html>\n<html><head><title>Streamed</title></head><body></body></html>"
+        chunks = [page[i:i + 8] for i in range(0, len(page), 8)]
+        with self.assertRaisesRegex(ValueError, "Document is empty"):
+            stream_meta(chunks, max_bytes=8) # capped within the doctype
+        with self.assertRaisesRegex(ValueError, "Document is empty"):
+            stream_meta([b"  \n  "])
+
+        meta, bytes_read = stream_meta(chunks, max_bytes=24) # capped within <head>
+        assert bytes_read == 24 and meta.title is None
@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 import asynctest
 import pytest
+from asynctest import mock
+from asynctest.mock import patch
+import asyncio
 from metadoc import Metadoc
+from metadoc.social import sessions
+from metadoc.fetch import Fetcher, Page
+from metadoc.cache import LRUCache, ResponseCache
 
 class MetadocModuleTest(asynctest.TestCase):
   def setUp(self):
@@ -12,6 +18,9 @@ class MetadocModuleTest(asynctest.TestCase):
 
     self.metadoc = Metadoc(url=self.url, html=self.article_html)
 
+  async def tearDown(self):
+    await sessions.close() # the test loop is closed next
+
   @asynctest.ignore_loop
   def test_init(self):
     assert self.metadoc.url == self.url
@@ -32,6 +41,108 @@ class MetadocModuleTest(asynctest.TestCase):
     self.metadoc.query("social")
     assert self.metadoc.activity
 
+  @asynctest.ignore_loop
+  def test_meta(self):
+    result = self.metadoc.query("meta")
+    assert result["authors"] == ["Lee Fang"]
+    assert result["published_date"] == "2016-11-26T14:51:40+00:00"
+    assert "text" not in result
+
+  @asynctest.ignore_loop
+  def test_meta_streamed(self):
+    with open("tests/fixtures/wired.com/inside-the-mind-of-amanda-feilding-countess-of-psychedelic-science.html", "rb") as f:
+      content = f.read()
+    chunks = [content[i:i + 16384] for i in range(0, len(content), 16384)]
+    req = mock.MagicMock(status_code=200, headers={"content-type": "text/html; charset=utf-8"}, encoding="utf-8")
+    req.iter_content.return_value = iter(chunks)
+
+    with patch("metadoc.fetch.requests.Session.get", return_value=req) as get:
+      result = Metadoc(url="https://www.wired.com/story/x/").query("meta")
+    assert get.call_args[1]["stream"] == True
+    assert result["title"] == "Inside the Mind of Amanda Feilding, Countess of Psychedelic Science"
+    assert next(req.iter_content.return_value, None) is not None # stopped early
+    req.close.assert_called_once_with()
+
+  @asynctest.ignore_loop
+  def test_response_cache(self):
+    cache = ResponseCache()
+    cache.set(self.url, "domain", {"domain": "theintercept.com", "credibility": {"is_blacklisted": False}})
+    cache.set(self.url, "social", [{"provider": "facebook", "metrics": []}])
+
+    with patch("metadoc.Metadoc._query_sections", return_value=["extract"]) as query_sections:
+      metadoc = Metadoc(url=self.url, html=self.article_html, response_cache=cache)
+      with patch("metadoc.Extractor.get_all"):
+        result = metadoc.query()
+    query_sections.assert_called_once_with(["extract"]) # only the missing section
+    assert result["domain"]["name"] == "theintercept.com"
+    assert result["social"] == [{"provider": "facebook", "metrics": []}]
+    assert cache.get(self.url, "extract")[1] == True
+
+    with patch("metadoc.Metadoc._query_sections") as query_sections, \
+        patch("metadoc.Extractor.get_all") as get_all, \
+        patch("metadoc.Metadoc._check_result") as check_result:
+      result = Metadoc(url=self.url, response_cache=cache).query()
+    query_sections.assert_not_called()
+    get_all.assert_not_called() # extract served from the cache
+    check_result.assert_called_once_with(result)
+    assert result["domain"]["name"] == "theintercept.com"
+
+  @asynctest.ignore_loop
+  def test_recompute_options(self):
+    fetcher, extract_cache = Fetcher(), LRUCache()
+    metadoc = Metadoc(url=self.url, fetcher=fetcher, extract_cache=extract_cache,
+      response_cache=ResponseCache())
+    with patch("metadoc.Metadoc._query_sections", autospec=True, return_value=[]) as query_sections:
+      metadoc._recompute(["social"])
+    refresh = query_sections.call_args[0][0]
+    assert refresh is not metadoc
+    assert refresh.fetcher is fetcher and refresh.extract_cache is extract_cache
+    assert refresh.response_cache is None
+
+  async def test_aquery(self):
+    social_started = asyncio.Event()
+
+    async def count_shares():
+      social_started.set()
+
+    async def download(url, session, conditional=False):
+      await asyncio.wait_for(social_started.wait(), 5) # social does not wait for the article
+      return Page(url, self.article_html.encode("utf-8"), "utf-8", None, None, False, None)
+
+    with patch("metadoc.ActivityCount.get_all", side_effect=lambda loop: asyncio.ensure_future(count_shares())), \
+        patch("metadoc.Domaintools.aget_all"), \
+        patch("metadoc.fetch.Fetcher.afetch", side_effect=download):
+      result = await Metadoc(url=self.url).aquery()
+    assert result["authors"] == ["Lee Fang"]
+    assert result["domain"]["name"] == "theintercept.com"
+
+  async def test_aquery_fail(self):
+    with patch("metadoc.ActivityCount.get_all", side_effect=lambda loop: asyncio.ensure_future(asyncio.sleep(0))), \
+        patch("metadoc.Domaintools.aget_all"), \
+        patch("metadoc.fetch.Fetcher.afetch", side_effect=Exception("Requesting article body failed with 404 status code.")):
+      result = await Metadoc(url=self.url).aquery()
+    assert result["errors"] == ["Requesting article body failed with 404 status code."]
+
+  async def test_aquery_not_modified(self):
+    extract_cache = LRUCache()
+    page = Page(self.url, self.article_html.encode("utf-8"), "utf-8", '"abc"', None, False, None)
+    with patch("metadoc.ActivityCount.get_all", side_effect=lambda loop: asyncio.ensure_future(asyncio.sleep(0))), \
+        patch("metadoc.Domaintools.aget_all"), \
+        patch("metadoc.fetch.Fetcher.afetch", return_value=page):
+      metadoc = Metadoc(url=self.url, extract_cache=extract_cache)
+      first = await metadoc.aquery()
+
+    not_modified = Page(self.url, None, None, '"abc"', None, True, metadoc.extractor.cachekey)
+    with patch("metadoc.ActivityCount.get_all", side_effect=lambda loop: asyncio.ensure_future(asyncio.sleep(0))), \
+        patch("metadoc.Domaintools.aget_all"), \
+        patch("metadoc.fetch.Fetcher.afetch", return_value=not_modified), \
+        patch("metadoc.fetch.Fetcher.fetch") as fetch, \
+        patch("metadoc.Extractor.parse_html") as parse_html:
+      second = await Metadoc(url=self.url, extract_cache=extract_cache).aquery()
+    fetch.assert_not_called() # no blocking download on the event loop
+    parse_html.assert_not_called()
+    assert second["text"] == first["text"]
+
   @asynctest.ignore_loop
   def test_social_return(self):
     result = self.metadoc.query("social", "social")
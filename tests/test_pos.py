@@ -3,10 +3,12 @@
 
 import asyncio
 import asynctest
+import os
 import pytest
+import tempfile
 
 from asynctest.mock import patch
-from metadoc.extract.pos import do_train, AveragedPerceptronTagger
+from metadoc.extract.pos import do_train, AveragedPerceptronTagger, CompactPerceptron, FeatureEncoder, PICKLE
 
 class MetadocPerceptronTest(asynctest.TestCase):
   def setUp(self):
@@ -31,8 +33,81 @@ class MetadocPerceptronTest(asynctest.TestCase):
     assert "Donald Trump" in entities
 
   @asynctest.ignore_loop
+  def test_tag_sents(self):
+    self.perceptron_tagger = AveragedPerceptronTagger(autoload=True)
+    sents = [
+      "Rami Eid is studying at Stony Brook University in NY".split(),
+      "Donald Trump won the 2016 presidential election".split(),
+    ]
+    tagged = self.perceptron_tagger.tag_sents(sents)
+
+    # context is reset per sentence, tagging them one by one is identical
+    assert tagged == [self.perceptron_tagger.tag_sents([s])[0] for s in sents]
+    assert tagged[1] == self.perceptron_tagger.tag(" ".join(sents[1]))
+    assert [len(t) for t in tagged] == [10, 7]
+    assert "Donald Trump" in self.perceptron_tagger.named_entities(tagged[1])
+
+  @asynctest.ignore_loop
+  def test_compact_same_tags(self):
+    tagger = AveragedPerceptronTagger(autoload=True)
+    compact_tagger = AveragedPerceptronTagger(autoload=True, compact=True)
+    test_sentence = "The extraordinary phenomenon of fake news spread by Facebook and other \
+      social media during the 2016 presidential election has been largely portrayed as a lucky break for Donald Trump"
+
+    assert isinstance(compact_tagger.model, CompactPerceptron)
+    assert compact_tagger.tag(test_sentence) == tagger.tag(test_sentence)
+
+  @asynctest.ignore_loop
+  def test_compact_tie_break(self):
+    weights = {0: {"X": 1.0, "Y": 1.0}, 1: {"Z": 0.5}}
+    model = CompactPerceptron.from_weights(weights, {"X", "Y", "Z"}, 3)
+    # ties resolve to the alphabetically last label, as in AveragedPerceptron
+    assert model.predict([0, 1]) == "Y"
+    assert model.predict([2]) == "Z"
+    assert model.predict([]) == "Z"
+
+  @asynctest.ignore_loop
+  def test_feature_encoder(self):
+    tagger = AveragedPerceptronTagger(autoload=False)
+    context = tagger.START + ["the", "dog", "barks"] + tagger.END
+    feats = tagger._get_features(1, "dog", context, "DT", "-START-", grow=True)
+    assert len(feats) == len(FeatureEncoder.TEMPLATES)
+    assert feats == tagger._get_features(1, "dog", context, "DT", "-START-")
+    # unseen features are dropped at inference
+    assert len(tagger._get_features(1, "cat", context, "DT", "-START-")) == 12
+
+  @asynctest.ignore_loop
+  def test_convert_legacy(self):
+    encoder = FeatureEncoder()
+    weights = encoder.convert_legacy({
+      "bias": {"NN": 1.0},
+      "i+1 word dog": {"NN": 2.0},
+      "i-1 tag+i word DT big": {"JJ": 3.0},
+    })
+    assert encoder.vocab[0][""] in weights
+    assert encoder.vocab[11]["dog"] in weights
+    assert weights[encoder.vocab[7][("DT", "big")]] == {"JJ": 3.0}
+
+  @asynctest.ignore_loop
+  @patch.object(AveragedPerceptronTagger, 'AP_MODEL_LOC', PICKLE)
   @patch('metadoc.extract.pos.pickle.load')
   def test_no_pickle_found(self, _mocked_func):
     _mocked_func.side_effect = IOError('foo')
     with pytest.raises(IOError):
       AveragedPerceptronTagger(autoload=True)
+
+  @asynctest.ignore_loop
+  def test_model_file(self):
+    tagger = AveragedPerceptronTagger(autoload=True)
+    test_sentence = "Rami Eid is studying at Stony Brook University in NY"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      loc = os.path.join(tmp_dir, "tagger.bin")
+      tagger.save(loc)
+      mapped_tagger = AveragedPerceptronTagger()
+      mapped_tagger.load(loc)
+
+      assert isinstance(mapped_tagger.model, CompactPerceptron)
+      assert mapped_tagger.encoder.vocab == tagger.encoder.vocab
+      assert mapped_tagger.tagdict == tagger.tagdict
+      assert mapped_tagger.tag(test_sentence) == tagger.tag(test_sentence)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+import pytest
+
+from metadoc.extract.registry import ModelRegistry
+
+class MetadocModelRegistryTest(unittest.TestCase):
+  def setUp(self):
+    self.calls = []
+    self.registry = ModelRegistry({"model": self.load_model})
+
+  def load_model(self):
+    self.calls.append(1)
+    return object()
+
+  def test_load_once(self):
+    first = self.registry.get("model")
+    assert self.registry.get("model") is first
+    assert self.registry.get("model") is first
+    assert len(self.calls) == 1
+
+    stats = self.registry.stats()["model"]
+    assert stats["loaded"] == True
+    assert stats["hits"] == 2
+    assert stats["load_time"] is not None
+
+  def test_concurrent_load(self):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(self.registry.get("model"))) for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert len(self.calls) == 1
+    assert len(set(map(id, results))) == 1
+
+  def test_warmup(self):
+    self.registry.register("other", self.load_model)
+    self.registry.warmup()
+    assert len(self.calls) == 2
+    assert self.registry.stats()["other"]["hits"] == 0
+
+  def test_unknown_model(self):
+    with pytest.raises(KeyError):
+      self.registry.get("foo")
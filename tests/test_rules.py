@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from metadoc.extract.html import HtmlMeta
+from metadoc.extract.stream import stream_meta
+from metadoc.extract.rules import RuleTable
+
+PAGE = """<html><head>
+  <meta name="date" content="{date}">
+  <meta property="article:published_time" content="2018-02-16T10:00:00Z">
+  <meta name="author" content="Jane Doe">
+  </head><body></body></html>"""
+
+class MetadocRuleTableTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmpdir.name, "rules.json")
+    self.rules = RuleTable(self.path, save_every=1)
+    self.shared = RuleTable() # in memory, instead of the one of the process
+    patcher = patch("metadoc.extract.rules.rules", self.shared)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def tearDown(self):
+    self.tmpdir.cleanup()
+
+  def test_learn_and_persist(self):
+    meta = HtmlMeta(PAGE.format(date="not a date"), domain="example.com", rules=self.rules)
+    assert meta.published_date == "2018-02-16T10:00:00+00:00"
+    assert meta.authors == ["Jane Doe"]
+    assert self.rules.get("example.com", "published_date") == "meta[@property='article:published_time']"
+    assert self.rules.get("example.com", "authors") == "meta:author"
+
+    # Learned rule wins over the chain order on the next page
+    reloaded = RuleTable(self.path)
+    meta = HtmlMeta(PAGE.format(date="2017-01-01T00:00:00Z"), domain="example.com", rules=reloaded)
+    assert meta.published_date == "2018-02-16T10:00:00+00:00"
+
+  def test_fallback_on_miss(self):
+    self.rules.hit("example.com", "published_date", "meta[@name='parsely-pub-date']")
+    meta = HtmlMeta(PAGE.format(date="2017-01-01T00:00:00Z"), domain="example.com", rules=self.rules)
+    assert meta.published_date == "2017-01-01T00:00:00+00:00"
+    assert self.rules.get("example.com", "published_date") == "meta[@name='date']"
+
+  def test_max_domains(self):
+    rules = RuleTable(max_domains=2)
+    for domain in ["a.com", "b.com", "a.com", "c.com"]:
+      rules.hit(domain, "authors", "meta:author")
+    assert rules.get("b.com", "authors") is None # learned least recently
+    assert rules.get("a.com", "authors") == "meta:author"
+    assert rules.get("c.com", "authors") == "meta:author"
+
+  def test_shared_table(self):
+    meta = HtmlMeta(PAGE.format(date="2017-01-01T00:00:00Z"), domain="example.com")
+    assert meta.published_date == "2017-01-01T00:00:00+00:00"
+    assert self.shared.get("example.com", "published_date") == "meta[@name='date']"
+
+  def test_stream_does_not_learn(self):
+    page = PAGE.format(date="2017-01-01T00:00:00Z").encode("utf-8")
+    meta, bytes_read = stream_meta([page], domain="example.com")
+    assert meta.published_date == "2017-01-01T00:00:00+00:00"
+    assert self.shared.get("example.com", "published_date") is None
@@ -5,18 +5,25 @@ import asyncio
 import asynctest
 import datetime
 import json
+import unittest
 import jmespath
 import urllib.parse
 
 from asynctest.mock import patch
 from metadoc.social import ActivityCount
 from metadoc.social.providers import providers
+from metadoc.social import activity
+from metadoc.social.breaker import CircuitBreaker
+from metadoc.social.session import SessionManager, sessions
 
 class MetadocActivityCountTest(asynctest.TestCase):
     def setUp(self):
         self.url = "https://theintercept.com/2016/11/26/laura-ingraham-lifezette/"
         self.activity = ActivityCount(url=self.url)
 
+    async def tearDown(self):
+        await sessions.close() # the test loop is closed next
+
     @asynctest.ignore_loop
     def test_init(self):
         assert self.activity.url == self.url
@@ -51,3 +58,72 @@ class MetadocActivityCountTest(asynctest.TestCase):
         activity = ActivityCount(url="nourlatall")
         res = await activity.collect_sharecount(url="nourlatall", provider="foo")
         assert res == None
+
+    async def test_timeout(self):
+        async def slow_json(url):
+            await asyncio.sleep(1)
+        provider = dict(providers[0], timeout=0.01)
+        with patch.object(ActivityCount, 'get_json', side_effect=slow_json), \
+                patch.dict(activity.breakers, {provider["provider"]: CircuitBreaker(failures=1)}):
+            await self.activity.collect_sharecount(provider["endpoint"].format(self.url), provider)
+            await self.activity.collect_sharecount(provider["endpoint"].format(self.url), provider)
+        assert [r["status"] for r in self.activity.responses] == ["timeout", "skipped"]
+
+class MetadocCircuitBreakerTest(unittest.TestCase):
+    def test_states(self):
+        breaker = CircuitBreaker(failures=2, cooldown=60)
+        breaker.failure()
+        assert breaker.allow()
+        breaker.failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        breaker.opened -= 60
+        assert breaker.allow() # one trial call
+        assert not breaker.allow()
+        breaker.failure()
+        assert breaker.state == "open"
+
+        breaker.opened -= 60
+        assert breaker.allow()
+        breaker.success()
+        assert breaker.state == "closed"
+        assert breaker.stats()["skipped"] == 2
+
+class MetadocSessionManagerTest(asynctest.TestCase):
+    async def test_session_per_loop(self):
+        manager = SessionManager(limit_per_host=5)
+        session = manager.get()
+        assert manager.get() is session
+        assert session.connector.limit_per_host == 5
+        await manager.close()
+        assert session.closed
+        assert manager.get() is not session
+        await manager.close()
+
+    @asynctest.ignore_loop
+    def test_run(self):
+        manager = SessionManager()
+        async def get_session():
+            return manager.get()
+        session = manager.run(get_session())
+        assert manager.run(get_session()) is session # shared across calls
+        manager.shutdown()
+        assert session.closed
+
+    @asynctest.ignore_loop
+    def test_closed_loop(self):
+        manager = SessionManager()
+        async def get_session():
+            session = manager.get()
+            await asyncio.sleep(0)
+            return session
+        old_loop = asyncio.new_event_loop()
+        session = old_loop.run_until_complete(get_session())
+        old_loop.close() # without manager.close()
+
+        loop = asyncio.new_event_loop()
+        assert loop.run_until_complete(get_session()) is not session
+        assert session.closed
+        loop.run_until_complete(manager.close())
+        loop.close()
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from metadoc.extract import suffix
+
+class MetadocSuffixTest(unittest.TestCase):
+  def test_registered_domain(self):
+    assert suffix.registered_domain("https://www.theguardian.co.uk/world/x") == "theguardian.co.uk"
+    assert suffix.registered_domain("theintercept.com/2016/11/26/") == "theintercept.com"
+    assert suffix.registered_domain("HTTPS://User@WWW.BBC.CO.UK:443/news") == "bbc.co.uk"
+    assert suffix.registered_domain("localhost") is None
+    assert suffix.registered_domain("http://127.0.0.1/") is None
+
+  def test_fqdn(self):
+    assert suffix.fqdn("https://70news.wordpress.com/2016/11/12/") == "70news.wordpress.com"
+    assert suffix.fqdn("https://theintercept.com/") == "theintercept.com"
+    assert suffix.fqdn("localhost") is None
+
+  def test_normalize_domains(self):
+    urls = ["https://www.nytimes.com/a", "https://nytimes.com/b", "", "https://blog.example.co.uk/"]
+    suffix.split_host.cache_clear()
+    assert suffix.normalize_domains(urls) == ["nytimes.com", "nytimes.com", None, "example.co.uk"]
+    assert suffix.split_host.cache_info().currsize == 3